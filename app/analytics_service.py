@@ -3,43 +3,149 @@ Analytics Service for Admin Dashboard
 Handles TF-IDF keyword extraction, anonymization, notification detection, and background jobs
 """
 
+import atexit
+import functools
+import os
 import threading
 import time
 import hashlib
+import uuid
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
-from collections import Counter
+from collections import Counter, defaultdict
+import itertools
 import json
 
 # Data processing
+import joblib
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.utils import murmurhash3_32
 
 # Supabase
 from flask import current_app
 
 
+def _iter_rows(query, page: int = 1000):
+    """
+    Stream a PostgREST query page by page.
+
+    Unbounded .execute() loads the whole result into one Python list; for
+    busy windows that is tens of MB of keyword arrays. Paging with .range()
+    keeps peak memory at one page while callers aggregate incrementally.
+    """
+    offset = 0
+    while True:
+        response = query.range(offset, offset + page - 1).execute()
+        rows = response.data or []
+        yield from rows
+        if len(rows) < page:
+            return
+        offset += page
+
+
+@functools.lru_cache(maxsize=100_000)
+def _anonymize_id(user_id: str) -> str:
+    """Map a user id to a short anonymous label (cached per unique id)"""
+    # User ids are UUIDs, which are already uniformly random - the first
+    # 3 bytes make a 6-hex-char label with no hash function needed. Parsing
+    # happens in C via uuid.UUID; blake2b covers any non-UUID id
+    try:
+        return f"User#{uuid.UUID(user_id).bytes[:3].hex()}"
+    except ValueError:
+        short_hash = hashlib.blake2b(user_id.encode(), digest_size=3).hexdigest()
+        return f"User#{short_hash}"
+
+
 class AnalyticsService:
     """Service for analytics tracking, keyword extraction, and notifications"""
     
+    # Shared vectorizer settings - built once so every extraction path (batch
+    # job, workers, single-query analyzer) tokenizes identically
+    _VEC_KWARGS = dict(
+        stop_words='english',
+        ngram_range=(1, 2),  # Unigrams and bigrams
+        min_df=1,
+        max_df=0.95,
+        dtype=np.float32
+    )
+    
     def __init__(self):
         self.tfidf_vectorizer = None
         self.last_keyword_computation = None
         self.keyword_cache = {}
+        self._analyzer = None
+        self._hv = None
+        self._hv_analyzer = None
+        self._scheduler = None
+        self._fitted_vec = None
+        self._fitted_features = None
+        self._fitted_checked = False
         
     def initialize(self, admin_supabase):
         """Initialize the analytics service with Supabase client"""
         self.admin_supabase = admin_supabase
+        self._install_pooled_session()
         print("✅ Analytics Service initialized")
     
+    def _install_pooled_session(self):
+        """
+        Swap the PostgREST client's HTTP session for one with a keep-alive
+        connection pool.
+        
+        The batch jobs issue many small requests in a row; without pooling
+        each .execute() can pay a fresh TCP + TLS handshake. Best-effort:
+        if the client internals don't match, the default session stays.
+        """
+        try:
+            import httpx
+            
+            postgrest = self.admin_supabase.postgrest
+            old_session = getattr(postgrest, 'session', None)
+            # auth_service may already have installed a pooled session on
+            # this client - don't wrap it a second time
+            if old_session is None or getattr(old_session, '_pooled', False):
+                return
+
+            session = httpx.Client(
+                base_url=old_session.base_url,
+                headers=old_session.headers,
+                limits=httpx.Limits(max_keepalive_connections=20),
+                timeout=30
+            )
+            session._pooled = True
+            postgrest.session = session
+            atexit.register(session.close)
+            print("✅ Pooled keep-alive session installed for analytics")
+        except Exception as e:
+            print(f"⚠️  Could not install pooled session: {str(e)}")
+    
     # ============================================
     # Keyword Extraction (TF-IDF)
     # ============================================
     
+    def _get_analyzer(self):
+        """
+        Lazily build and cache sklearn's text analyzer.
+        
+        The analyzer bundles the compiled token regex, stop-word filtering
+        and n-gram generation, so per-call work is one regex pass instead of
+        constructing and fitting a whole vectorizer (and its vocabulary dict)
+        for every query.
+        """
+        if self._analyzer is None:
+            self._analyzer = TfidfVectorizer(**self._VEC_KWARGS).build_analyzer()
+        return self._analyzer
+    
     def extract_keywords_tfidf(self, text: str, top_n: int = 5) -> List[str]:
         """
-        Extract top keywords from text using TF-IDF
+        Extract top keywords from a single text
+        
+        Fitting TF-IDF on one document degenerates to plain term frequency,
+        so this ranks terms by frequency using the cached analyzer and a
+        C-level Counter instead of building a fresh vectorizer per call.
         
         Args:
             text: Input text to extract keywords from
@@ -55,42 +161,66 @@ class AnalyticsService:
             # Simple preprocessing
             text = text.lower().strip()
             
-            # Use sklearn's TfidfVectorizer for single document
-            # For better results with single doc, we create a simple corpus
-            vectorizer = TfidfVectorizer(
-                max_features=top_n,
-                stop_words='english',
-                ngram_range=(1, 2),  # Unigrams and bigrams
-                min_df=1,
-                max_df=1.0
-            )
-            
-            # Fit and transform
             try:
-                tfidf_matrix = vectorizer.fit_transform([text])
-                feature_names = vectorizer.get_feature_names_out()
+                tokens = self._get_analyzer()(text)
+                if not tokens:
+                    return []
                 
-                # Get scores
-                scores = tfidf_matrix.toarray()[0]
-                
-                # Sort by score
-                top_indices = scores.argsort()[-top_n:][::-1]
-                keywords = [feature_names[i] for i in top_indices if scores[i] > 0]
-                
-                return keywords
+                counter = Counter(tokens)
+                return [term for term, _ in counter.most_common(top_n)]
             except:
-                # Fallback: simple word frequency
-                words = text.split()
-                # Remove common words
-                stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'from', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'should', 'could', 'may', 'might', 'can', 'about', 'what', 'when', 'where', 'who', 'why', 'how'}
-                words = [w for w in words if w.lower() not in stop_words and len(w) > 3]
-                counter = Counter(words)
-                return [word for word, _ in counter.most_common(top_n)]
+                # Fallback: stateless hashing - no vocabulary to build, so it
+                # stays cheap and thread-safe even when the main path fails
+                return self._extract_keywords_hashed(text, top_n)
                 
         except Exception as e:
             print(f"⚠️  Keyword extraction error: {str(e)}")
             return []
     
+    def _extract_keywords_hashed(self, text: str, top_n: int = 5) -> List[str]:
+        """
+        Per-document keyword fallback using a stateless HashingVectorizer.
+        
+        Hashing needs no fitted vocabulary dict, so transform is a single
+        pass in compiled code. Feature hashing is one-way, so the top-scoring
+        buckets are mapped back to strings by re-hashing the document's own
+        tokens and keeping those that land in a top bucket.
+        """
+        if self._hv is None:
+            self._hv = HashingVectorizer(
+                n_features=2 ** 18,
+                alternate_sign=False,
+                ngram_range=(1, 2)
+            )
+            self._hv_analyzer = self._hv.build_analyzer()
+        
+        X = self._hv.transform([text])
+        if X.nnz == 0:
+            return []
+        
+        if X.data.size > top_n:
+            idx = np.argpartition(-X.data, top_n)[:top_n]
+        else:
+            idx = np.arange(X.data.size)
+        top_buckets = set(X.indices[idx].tolist())
+        
+        keywords = []
+        seen = set()
+        for token in self._hv_analyzer(text):
+            if token in seen:
+                continue
+            seen.add(token)
+            # FeatureHasher buckets via abs(signed hash) % n_features, which
+            # differs from the unsigned hash for negative values - re-hash
+            # the same way or tokens miss their own buckets
+            bucket = abs(murmurhash3_32(token)) % self._hv.n_features
+            if bucket in top_buckets:
+                keywords.append(token)
+                if len(keywords) == top_n:
+                    break
+        
+        return keywords
+    
     def compute_keyword_trends(self, hours: int = 24) -> List[Dict[str, Any]]:
         """
         Compute keyword trends from recent queries
@@ -102,33 +232,45 @@ class AnalyticsService:
             List of {keyword, count, trend} dictionaries
         """
         try:
+            # Aggregate near the data: unnest(keywords) + GROUP BY in Postgres
+            # ships 50 rows instead of every keywords array in the window
+            try:
+                response = self.admin_supabase.rpc(
+                    'get_keyword_trends', {'hours': hours, 'lim': 50}
+                ).execute()
+                if response.data is not None:
+                    return [
+                        {'keyword': r['keyword'], 'count': r['count']}
+                        for r in response.data
+                    ]
+            except Exception as rpc_error:
+                print(f"⚠️  get_keyword_trends RPC unavailable, falling back: {str(rpc_error)}")
+
             cutoff_time = datetime.utcnow() - timedelta(hours=hours)
-            
-            # Fetch recent queries with cached keywords
-            response = self.admin_supabase.table('query_analytics')\
-                .select('keywords, created_at')\
+
+            # Stream recent queries with cached keywords page by page and
+            # aggregate in one Counter construction: chained iterables hit
+            # Counter's C-level counting fast path
+            query = self.admin_supabase.table('query_analytics')\
+                .select('keywords')\
                 .gte('created_at', cutoff_time.isoformat())\
-                .not_.is_('keywords', 'null')\
-                .execute()
-            
-            if not response.data:
+                .not_.is_('keywords', 'null')
+
+            keyword_counts = Counter(itertools.chain.from_iterable(
+                r['keywords'] for r in _iter_rows(query) if r.get('keywords')
+            ))
+
+            if not keyword_counts:
                 return []
-            
-            # Aggregate keywords
-            keyword_counts = Counter()
-            for record in response.data:
-                keywords = record.get('keywords', [])
-                if isinstance(keywords, list):
-                    keyword_counts.update(keywords)
-            
+
             # Return top keywords
             trends = [
                 {'keyword': keyword, 'count': count}
                 for keyword, count in keyword_counts.most_common(50)
             ]
-            
+
             return trends
-            
+
         except Exception as e:
             print(f"⚠️  Keyword trends error: {str(e)}")
             return []
@@ -145,28 +287,36 @@ class AnalyticsService:
             List of {keyword, count} dictionaries
         """
         try:
+            # Same server-side aggregation as compute_keyword_trends
+            try:
+                response = self.admin_supabase.rpc(
+                    'get_keyword_trends', {'hours': days * 24, 'lim': limit}
+                ).execute()
+                if response.data is not None:
+                    return [
+                        {'keyword': r['keyword'], 'count': r['count']}
+                        for r in response.data
+                    ]
+            except Exception as rpc_error:
+                print(f"⚠️  get_keyword_trends RPC unavailable, falling back: {str(rpc_error)}")
+
             from_date = datetime.utcnow() - timedelta(days=days)
-            
-            result = self.admin_supabase.table('query_analytics')\
+
+            query = self.admin_supabase.table('query_analytics')\
                 .select('keywords')\
                 .gte('created_at', from_date.isoformat())\
-                .not_.is_('keywords', 'null')\
-                .execute()
+                .not_.is_('keywords', 'null')
             
-            if not result.data:
-                return []
+            # Stream pages and count via Counter's C-level fast path
+            keyword_counts = Counter(itertools.chain.from_iterable(
+                r['keywords'] for r in _iter_rows(query) if r.get('keywords')
+            ))
             
-            # Count keyword frequencies
-            keyword_counts = Counter()
-            for row in result.data:
-                if row.get('keywords'):
-                    keywords = row['keywords']
-                    if isinstance(keywords, list):
-                        keyword_counts.update(keywords)
+            if not keyword_counts:
+                return []
             
             # Sort and return top keywords
-            sorted_keywords = sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)
-            return [{'keyword': k, 'count': c} for k, c in sorted_keywords[:limit]]
+            return [{'keyword': k, 'count': c} for k, c in keyword_counts.most_common(limit)]
         
         except Exception as e:
             print(f"❌ Error getting top keywords: {e}")
@@ -184,6 +334,23 @@ class AnalyticsService:
             Dictionary of {keyword: [query_ids]}
         """
         try:
+            # Aggregate in Postgres: the topic_clusters() function groups the
+            # normalized query_keywords rows (keyword -> array_agg(query_id))
+            # so only the grouped result crosses the wire
+            try:
+                response = self.admin_supabase.rpc('topic_clusters', {
+                    'date_from': date_from,
+                    'date_to': date_to
+                }).execute()
+                
+                if response.data:
+                    return {
+                        row['keyword']: row['ids'] for row in response.data
+                    }
+                return {}
+            except Exception as e:
+                print(f"⚠️  topic_clusters RPC unavailable, falling back: {str(e)}")
+            
             query = self.admin_supabase.table('query_analytics').select('id, keywords')
             
             if date_from:
@@ -191,22 +358,17 @@ class AnalyticsService:
             if date_to:
                 query = query.lte('created_at', date_to)
             
-            response = query.not_.is_('keywords', 'null').execute()
-            
-            if not response.data:
-                return {}
+            query = query.not_.is_('keywords', 'null')
             
-            # Group by keywords
-            clusters = {}
-            for record in response.data:
-                keywords = record.get('keywords', [])
-                if isinstance(keywords, list):
-                    for keyword in keywords:
-                        if keyword not in clusters:
-                            clusters[keyword] = []
-                        clusters[keyword].append(record['id'])
+            # Stream pages and group by keyword: defaultdict removes the
+            # per-keyword membership test and the generator keeps the loop tight
+            clusters = defaultdict(list)
+            for keyword, query_id in (
+                (kw, r['id']) for r in _iter_rows(query) for kw in r.get('keywords') or ()
+            ):
+                clusters[keyword].append(query_id)
             
-            return clusters
+            return dict(clusters)
             
         except Exception as e:
             print(f"⚠️  Topic clustering error: {str(e)}")
@@ -231,31 +393,170 @@ class AnalyticsService:
             if not response.data:
                 print("ℹ️  No queries to process for keywords")
                 return
-            
-            updated_count = 0
-            for record in response.data:
-                # Skip if keywords already computed
-                if record.get('keywords') and len(record.get('keywords', [])) > 0:
-                    continue
-                
-                # Extract keywords
-                keywords = self.extract_keywords_tfidf(record['query_text'], top_n=10)
-                
-                if keywords:
-                    # Update record
-                    self.admin_supabase.table('query_analytics')\
-                        .update({'keywords': keywords})\
-                        .eq('id', record['id'])\
-                        .execute()
-                    
-                    updated_count += 1
-            
-            print(f"✅ Updated keywords for {updated_count} queries")
+
+            # Skip rows with keywords already computed; an empty array means
+            # "processed, nothing extractable" and is not re-processed
+            records_to_process = [
+                r for r in response.data
+                if r.get('query_text') and r.get('keywords') is None
+            ]
+
+            if not records_to_process:
+                print("ℹ️  No queries to process for keywords")
+                return
+
+            updated = self._process_keyword_records(records_to_process)
+            print(f"✅ Updated keywords for {updated} queries")
             self.last_keyword_computation = datetime.utcnow()
             
         except Exception as e:
             print(f"❌ Batch keyword update error: {str(e)}")
     
+    @staticmethod
+    def _tfidf_model_path() -> str:
+        """Where the persisted (vocabulary, idf) pair lives"""
+        return os.path.join(os.environ.get('DATA_DIR', 'data'), 'tfidf_model.joblib')
+    
+    def _load_fitted_vectorizer(self):
+        """
+        Load the persisted TF-IDF model for transform-only extraction.
+        
+        The domain vocabulary is stable, so the IDF table is fitted nightly
+        by refresh_tfidf_model and reused here: transform-only skips the
+        vocabulary build that dominates a per-batch fit. Returns None until
+        a model has been persisted.
+        """
+        if self._fitted_checked:
+            return self._fitted_vec
+        self._fitted_checked = True
+        try:
+            vocabulary, idf = joblib.load(self._tfidf_model_path())
+            vec = TfidfVectorizer(**self._VEC_KWARGS, vocabulary=vocabulary)
+            vec._tfidf._idf_diag = sp.diags(
+                idf, offsets=0, shape=(len(idf), len(idf)),
+                format='csr', dtype=np.float64
+            )
+            self._fitted_vec = vec
+            self._fitted_features = vec.get_feature_names_out()
+            print(f"✅ Loaded persisted TF-IDF model ({len(vocabulary)} terms)")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️  Could not load TF-IDF model: {str(e)}")
+        return self._fitted_vec
+    
+    def refresh_tfidf_model(self, days_back: int = 30):
+        """
+        Nightly job: fit the keyword vocabulary + IDF on recent queries and
+        persist it so batch extraction can run transform-only.
+        """
+        try:
+            cutoff_time = datetime.utcnow() - timedelta(days=days_back)
+            query = self.admin_supabase.table('query_analytics')\
+                .select('query_text')\
+                .gte('created_at', cutoff_time.isoformat())
+            
+            texts = [r['query_text'].lower() for r in _iter_rows(query) if r.get('query_text')]
+            if len(texts) < 50:
+                print("ℹ️  Not enough queries to refresh TF-IDF model")
+                return
+            
+            vec = TfidfVectorizer(**{**self._VEC_KWARGS, 'min_df': 5, 'max_features': 50_000})
+            vec.fit(texts)
+            
+            path = self._tfidf_model_path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            joblib.dump((vec.vocabulary_, vec.idf_), path)
+            
+            # Pick up the fresh model on next use
+            self._fitted_checked = False
+            self._fitted_vec = None
+            print(f"✅ Refreshed TF-IDF model on {len(texts)} queries")
+        except Exception as e:
+            print(f"❌ TF-IDF model refresh error: {str(e)}")
+    
+    def extract_keywords_batch(self, texts: List[str], top_n: int = 10) -> List[List[str]]:
+        """
+        Extract top keywords for a batch of texts in one vectorizer pass.
+        
+        One batched transform is a single C-level tokenization pass and one
+        sparse matrix build, instead of N per-text calls.
+        
+        Args:
+            texts: Input texts (one keyword list is returned per text)
+            top_n: Number of top keywords per text
+            
+        Returns:
+            List of keyword lists, aligned with the input texts
+        """
+        texts = [(t or '').lower() for t in texts]
+        
+        try:
+            fitted = self._load_fitted_vectorizer()
+            if fitted is not None:
+                # Transform-only against the persisted vocabulary/IDF: no
+                # per-batch vocabulary build, just tokenize and multiply
+                tfidf_matrix = fitted.transform(texts)
+                feature_names = self._fitted_features
+            else:
+                # No persisted model yet: one batched fit_transform. Fitting
+                # across the batch also makes IDF meaningful (a
+                # single-document fit degenerates to plain TF)
+                vectorizer = TfidfVectorizer(**self._VEC_KWARGS)
+                tfidf_matrix = vectorizer.fit_transform(texts)
+                feature_names = vectorizer.get_feature_names_out()
+        except ValueError:
+            # Degenerate batch (e.g. all stop words) - nothing to extract
+            return [[] for _ in texts]
+
+        results = []
+        for i in range(len(texts)):
+            row = tfidf_matrix.getrow(i)
+            if row.nnz == 0:
+                results.append([])
+                continue
+
+            # Top-N keywords straight from the sparse row: argpartition is
+            # O(nnz) vs argsort's O(nnz log nnz), and nothing is densified
+            data = row.data
+            if data.size > top_n:
+                sel = np.argpartition(-data, top_n)[:top_n]
+                order = sel[np.argsort(-data[sel])]
+            else:
+                order = np.argsort(-data)
+            results.append(feature_names[row.indices[order]].tolist())
+
+        return results
+
+    def _process_keyword_records(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Extract keywords for a batch of records and write them back.
+        
+        Args:
+            records: Rows with 'id' and 'query_text'
+            
+        Returns:
+            Number of rows updated
+        """
+        per_row = self.extract_keywords_batch([r.get('query_text') or '' for r in records])
+        # Rows with no extractable keywords (stop-word-only queries) get an
+        # empty array rather than staying NULL: NULL means "not processed
+        # yet" to the work-queue select, so skipping them would re-fetch the
+        # same rows forever and starve newer ones
+        updates = [
+            {'id': record['id'], 'keywords': keywords or []}
+            for record, keywords in zip(records, per_row)
+        ]
+
+        # One upsert per 500-row chunk instead of one round-trip per row
+        for start in range(0, len(updates), 500):
+            chunk = updates[start:start + 500]
+            self.admin_supabase.table('query_analytics')\
+                .upsert(chunk, on_conflict='id')\
+                .execute()
+
+        return len(updates)
+    
     # ============================================
     # User Anonymization
     # ============================================
@@ -272,11 +573,9 @@ class AnalyticsService:
             Anonymized identifier like "User#a1b2c3"
         """
         try:
-            # Create a short hash from user_id
-            hash_obj = hashlib.md5(user_id.encode())
-            short_hash = hash_obj.hexdigest()[:6]
-            
-            return f"User#{short_hash}"
+            # Repeat ids are common in analytics tables, so the hash work is
+            # cached per unique id
+            return _anonymize_id(user_id)
             
         except Exception as e:
             print(f"⚠️  Anonymization error: {str(e)}")
@@ -312,8 +611,24 @@ class AnalyticsService:
             # Convert to DataFrame
             df = pd.DataFrame(response.data)
             
-            # Anonymize user IDs
-            df['anonymized_user'] = df['user_id'].apply(self.anonymize_user)
+            # Anonymize user IDs - label only the unique ids and map, instead
+            # of a Python-level .apply per row. UUID entropy gives the label
+            # directly: pack the parsed bytes and truncate with numpy
+            unique_ids = df['user_id'].unique()
+            try:
+                raw = np.frombuffer(
+                    b''.join(uuid.UUID(u).bytes for u in unique_ids),
+                    dtype=np.uint8
+                ).reshape(-1, 16)
+                shorts = (raw[:, 0].astype(np.uint32) << 16) \
+                    | (raw[:, 1].astype(np.uint32) << 8) \
+                    | raw[:, 2].astype(np.uint32)
+                mapping = dict(zip(unique_ids, ('User#%06x' % x for x in shorts)))
+            except (ValueError, TypeError, AttributeError):
+                # Non-UUID ids in the batch (uuid.UUID raises TypeError on
+                # None) - fall back to per-id hashing
+                mapping = {u: self.anonymize_user(u) for u in unique_ids}
+            df['anonymized_user'] = df['user_id'].map(mapping)
             df = df.drop(columns=['user_id'])
             
             return df
@@ -326,35 +641,57 @@ class AnalyticsService:
     # Notification System (Anomaly Detection)
     # ============================================
     
-    def check_query_spike(self, threshold_multiplier: float = 2.0) -> Optional[Dict[str, Any]]:
+    def _fetch_anomaly_snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Fetch all counts needed by the anomaly checks in one round-trip.
+
+        Calls the anomaly_snapshot() Postgres function, which gathers the
+        last-hour/7-day query counts, last-hour error count, and 24h feedback
+        stats in a single query with CTEs. Returns None when the function is
+        unavailable so checks fall back to their own queries.
+        """
+        try:
+            response = self.admin_supabase.rpc('anomaly_snapshot').execute()
+            if isinstance(response.data, dict):
+                return response.data
+            if isinstance(response.data, list) and response.data:
+                return response.data[0]
+            return None
+        except Exception as e:
+            print(f"⚠️  anomaly_snapshot RPC unavailable, falling back: {str(e)}")
+            return None
+
+    def check_query_spike(self, threshold_multiplier: float = 2.0, snapshot: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Detect if current hour has unusually high query volume
         
         Args:
             threshold_multiplier: Spike threshold (e.g., 2.0 = 2x normal)
+            snapshot: Optional precomputed counts from _fetch_anomaly_snapshot
             
         Returns:
             Notification dict if spike detected, None otherwise
         """
         try:
-            # Get queries in last hour
-            one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-            response_recent = self.admin_supabase.table('query_analytics')\
-                .select('id', count='exact')\
-                .gte('created_at', one_hour_ago.isoformat())\
-                .execute()
-            
-            current_count = response_recent.count if hasattr(response_recent, 'count') else 0
-            
-            # Get average hourly queries over last 7 days
-            seven_days_ago = datetime.utcnow() - timedelta(days=7)
-            response_historical = self.admin_supabase.table('query_analytics')\
-                .select('id', count='exact')\
-                .gte('created_at', seven_days_ago.isoformat())\
-                .execute()
+            avg_hourly = None
+            if snapshot is not None:
+                current_count = snapshot.get('queries_last_hour', 0)
+                historical_count = snapshot.get('queries_last_7d', 0)
+            else:
+                # Get queries in last hour (small window, exact count is cheap)
+                one_hour_ago = datetime.utcnow() - timedelta(hours=1)
+                response_recent = self.admin_supabase.table('query_analytics')\
+                    .select('id', count='exact')\
+                    .gte('created_at', one_hour_ago.isoformat())\
+                    .execute()
+                
+                current_count = response_recent.count if hasattr(response_recent, 'count') else 0
+                
+                avg_hourly = self._get_hourly_baseline()
+                historical_count = 0
             
-            historical_count = response_historical.count if hasattr(response_historical, 'count') else 0
-            avg_hourly = historical_count / (7 * 24) if historical_count > 0 else 1
+            if avg_hourly is None:
+                avg_hourly = historical_count / (7 * 24) if historical_count > 0 else 1
             
             # Check if spike
             if current_count > avg_hourly * threshold_multiplier:
@@ -376,35 +713,76 @@ class AnalyticsService:
             print(f"⚠️  Query spike check error: {str(e)}")
             return None
     
-    def check_error_rate(self, threshold_percent: float = 10.0) -> Optional[Dict[str, Any]]:
+    def _get_hourly_baseline(self) -> Optional[float]:
+        """
+        Get the average hourly query volume over the last 7 days.
+
+        Reads the query_analytics_hourly rollup table (maintained by an
+        AFTER INSERT trigger, so it's ~168 tiny rows instead of a full scan
+        of query_analytics). Falls back to a planner-estimated count over the
+        7-day window when the rollup table doesn't exist.
+        """
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        try:
+            response = self.admin_supabase.table('query_analytics_hourly')\
+                .select('cnt')\
+                .gte('hour', seven_days_ago.isoformat())\
+                .execute()
+            
+            if response.data:
+                return sum(r['cnt'] for r in response.data) / (7 * 24)
+        except Exception as e:
+            print(f"⚠️  Hourly rollup unavailable, using estimated count: {str(e)}")
+        
+        try:
+            # count='planned' returns the planner's row estimate - bounded
+            # work regardless of table size, and plenty accurate for a
+            # baseline that only needs order of magnitude
+            response = self.admin_supabase.table('query_analytics')\
+                .select('id', count='planned')\
+                .gte('created_at', seven_days_ago.isoformat())\
+                .execute()
+            
+            historical_count = response.count if hasattr(response, 'count') else 0
+            return historical_count / (7 * 24) if historical_count else None
+        except Exception as e:
+            print(f"⚠️  Estimated count error: {str(e)}")
+            return None
+    
+    def check_error_rate(self, threshold_percent: float = 10.0, snapshot: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Detect if error rate is too high
         
         Args:
             threshold_percent: Error rate threshold (e.g., 10.0 = 10%)
+            snapshot: Optional precomputed counts from _fetch_anomaly_snapshot
             
         Returns:
             Notification dict if high error rate, None otherwise
         """
         try:
-            # Get counts from last hour
-            one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-            
-            # Total queries
-            response_queries = self.admin_supabase.table('query_analytics')\
-                .select('id', count='exact')\
-                .gte('created_at', one_hour_ago.isoformat())\
-                .execute()
-            
-            total_queries = response_queries.count if hasattr(response_queries, 'count') else 0
-            
-            # Total errors
-            response_errors = self.admin_supabase.table('error_logs')\
-                .select('id', count='exact')\
-                .gte('created_at', one_hour_ago.isoformat())\
-                .execute()
-            
-            total_errors = response_errors.count if hasattr(response_errors, 'count') else 0
+            if snapshot is not None:
+                total_queries = snapshot.get('queries_last_hour', 0)
+                total_errors = snapshot.get('errors_last_hour', 0)
+            else:
+                # Get counts from last hour
+                one_hour_ago = datetime.utcnow() - timedelta(hours=1)
+                
+                # Total queries
+                response_queries = self.admin_supabase.table('query_analytics')\
+                    .select('id', count='exact')\
+                    .gte('created_at', one_hour_ago.isoformat())\
+                    .execute()
+                
+                total_queries = response_queries.count if hasattr(response_queries, 'count') else 0
+                
+                # Total errors
+                response_errors = self.admin_supabase.table('error_logs')\
+                    .select('id', count='exact')\
+                    .gte('created_at', one_hour_ago.isoformat())\
+                    .execute()
+                
+                total_errors = response_errors.count if hasattr(response_errors, 'count') else 0
             
             if total_queries == 0:
                 return None
@@ -430,32 +808,43 @@ class AnalyticsService:
             print(f"⚠️  Error rate check error: {str(e)}")
             return None
     
-    def check_satisfaction_drop(self, threshold_percent: float = 60.0) -> Optional[Dict[str, Any]]:
+    def check_satisfaction_drop(self, threshold_percent: float = 60.0, snapshot: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Detect if user satisfaction is below threshold
         
         Args:
             threshold_percent: Satisfaction threshold (e.g., 60.0 = 60%)
+            snapshot: Optional precomputed counts from _fetch_anomaly_snapshot
             
         Returns:
             Notification dict if low satisfaction, None otherwise
         """
         try:
-            # Get feedback from last 24 hours
-            one_day_ago = datetime.utcnow() - timedelta(days=1)
-            
-            response = self.admin_supabase.table('user_feedback')\
-                .select('rating')\
-                .gte('created_at', one_day_ago.isoformat())\
-                .execute()
-            
-            if not response.data or len(response.data) < 10:  # Need at least 10 ratings
+            if snapshot is not None:
+                total_feedback = snapshot.get('feedback_total_24h', 0)
+                positive_count = snapshot.get('feedback_positive_24h', 0)
+            else:
+                # Get feedback from last 24 hours
+                one_day_ago = datetime.utcnow() - timedelta(days=1)
+                
+                response = self.admin_supabase.table('user_feedback')\
+                    .select('rating')\
+                    .gte('created_at', one_day_ago.isoformat())\
+                    .execute()
+                
+                rows = response.data or []
+                # Vectorized tally: one int8 array, one SIMD-backed comparison
+                ratings = np.fromiter(
+                    (r['rating'] for r in rows), dtype=np.int8, count=len(rows)
+                )
+                total_feedback = int(ratings.size)
+                positive_count = int(np.count_nonzero(ratings >= 4))
+            
+            if total_feedback < 10:  # Need at least 10 ratings
                 return None
             
             # Calculate satisfaction (rating >= 4 is positive)
-            ratings = [r['rating'] for r in response.data]
-            positive_count = sum(1 for r in ratings if r >= 4)
-            satisfaction_rate = (positive_count / len(ratings)) * 100
+            satisfaction_rate = (positive_count / total_feedback) * 100
             
             if satisfaction_rate < threshold_percent:
                 return {
@@ -465,7 +854,7 @@ class AnalyticsService:
                     'severity': 'warning',
                     'metadata': json.dumps({
                         'satisfaction_rate': satisfaction_rate,
-                        'total_feedback': len(ratings),
+                        'total_feedback': total_feedback,
                         'positive_count': positive_count
                     })
                 }
@@ -531,10 +920,14 @@ class AnalyticsService:
         try:
             print("🔍 Running anomaly checks...")
             
+            # One round-trip for every count the checks need; each check falls
+            # back to its own queries when the snapshot RPC is unavailable
+            snapshot = self._fetch_anomaly_snapshot()
+            
             checks = [
-                self.check_query_spike(),
-                self.check_error_rate(),
-                self.check_satisfaction_drop(),
+                self.check_query_spike(snapshot=snapshot),
+                self.check_error_rate(snapshot=snapshot),
+                self.check_satisfaction_drop(snapshot=snapshot),
                 # COMPETITION: Temporarily disabled - uncomment to enable slow response monitoring
                 # self.check_slow_responses()
             ]
@@ -542,10 +935,11 @@ class AnalyticsService:
             # Filter out None results
             notifications = [n for n in checks if n is not None]
             
-            # Insert notifications
-            for notif in notifications:
-                self.admin_supabase.table('admin_notifications').insert(notif).execute()
-                print(f"📢 Created notification: {notif['title']}")
+            # One batched insert instead of a round-trip per notification
+            if notifications:
+                self.admin_supabase.table('admin_notifications').insert(notifications).execute()
+                for notif in notifications:
+                    print(f"📢 Created notification: {notif['title']}")
             
             if not notifications:
                 print("✅ No anomalies detected")
@@ -557,40 +951,106 @@ class AnalyticsService:
     # Background Jobs
     # ============================================
     
+    def _jobs_enabled(self) -> bool:
+        """
+        Whether this process should run the periodic background jobs.
+
+        Under gunicorn every worker would otherwise start its own scheduler
+        and keyword workers, running the same job N times per tick. Advisory
+        locks can't guard this through PostgREST (each RPC runs on a
+        different pooled session, so lock and unlock never share a backend),
+        so workers elect a single job runner via an exclusive flock on a
+        local lockfile: the first worker to grab it runs the jobs, the rest
+        skip them, and if the job runner dies the kernel releases the lock
+        so its gunicorn replacement picks the jobs up on boot. RUN_JOBS=0
+        opts a process out entirely (e.g. web workers in a deployment that
+        runs one dedicated job process with RUN_JOBS=1).
+        """
+        if os.getenv('RUN_JOBS', '1').lower() not in ('true', '1', 't'):
+            return False
+        try:
+            import fcntl
+            lock_file = open('/tmp/adal_naga_jobs.lock', 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:
+            # No fcntl (Windows dev) - single process, no election needed
+            return True
+        except OSError:
+            return False
+        # Keep the fd referenced for the process lifetime; closing it would
+        # release the lock and let another worker start duplicate jobs
+        self._jobs_lock_file = lock_file
+        return True
+
     def start_background_jobs(self):
         """
         Start background threads for periodic tasks
         """
-        # Keyword computation job (runs hourly)
-        keyword_thread = threading.Thread(target=self._keyword_job_loop, daemon=True)
-        keyword_thread.start()
-        print("✅ Started keyword computation background job")
+        if not self._jobs_enabled():
+            print("◯ Background jobs not started in this process (RUN_JOBS=0 or another worker holds the job lock)")
+            return
+
+        # Keyword worker: rows with keywords IS NULL form the work queue, so
+        # new queries get keywords within seconds instead of up to an hour.
+        # One daemon thread on purpose: the select has no row-claiming, so
+        # parallel loops would all fetch the same unclaimed batch and race
+        # each other's upserts, and a daemon thread (unlike a
+        # ThreadPoolExecutor, which concurrent.futures joins at interpreter
+        # exit) doesn't block gunicorn's graceful restarts.
+        self._keyword_thread = threading.Thread(
+            target=self._keyword_worker, name='keywords', daemon=True
+        )
+        self._keyword_thread.start()
+        print("✅ Started keyword worker")
         
-        # Anomaly detection job (runs hourly)
-        anomaly_thread = threading.Thread(target=self._anomaly_job_loop, daemon=True)
-        anomaly_thread.start()
-        print("✅ Started anomaly detection background job")
+        # Anomaly detection: one scheduler thread with a cron trigger instead
+        # of a dedicated sleep-forever thread; max_instances=1 prevents a slow
+        # run from overlapping the next, coalesce folds missed runs into one
+        from apscheduler.schedulers.background import BackgroundScheduler
+        
+        self._scheduler = BackgroundScheduler(daemon=True)
+        self._scheduler.add_job(
+            self.run_anomaly_checks,
+            'cron', minute=10, max_instances=1, coalesce=True
+        )
+        # Nightly vocabulary/IDF refresh for transform-only keyword extraction
+        self._scheduler.add_job(
+            self.refresh_tfidf_model,
+            'cron', hour=3, minute=0, max_instances=1, coalesce=True
+        )
+        self._scheduler.start()
+        print("✅ Scheduled hourly anomaly checks")
     
-    def _keyword_job_loop(self):
-        """Background loop for keyword computation"""
+    def _keyword_worker(self):
+        """Drain unprocessed rows in small batches; idle-poll when caught up"""
         while True:
             try:
-                time.sleep(3600)  # Run every hour
-                print("⏰ Running scheduled keyword computation...")
-                self.update_query_keywords_batch(hours_back=2)
+                response = self.admin_supabase.table('query_analytics')\
+                    .select('id, query_text')\
+                    .is_('keywords', 'null')\
+                    .order('created_at')\
+                    .limit(200)\
+                    .execute()
+                
+                # No query_text filter: text-less rows must still get their
+                # empty array written back or they'd be re-fetched forever
+                rows = response.data or []
+                if not rows:
+                    time.sleep(30)
+                    continue
+
+                updated = self._process_keyword_records(rows)
+                if updated:
+                    print(f"✅ Keyword worker updated {updated} queries")
+                    self.last_keyword_computation = datetime.utcnow()
+                else:
+                    # Nothing written back - back off instead of re-issuing
+                    # the same select in a tight loop
+                    time.sleep(5)
             except Exception as e:
-                print(f"❌ Keyword job error: {str(e)}")
+                print(f"❌ Keyword worker error: {str(e)}")
+                time.sleep(30)
     
-    def _anomaly_job_loop(self):
-        """Background loop for anomaly detection"""
-        while True:
-            try:
-                time.sleep(3600)  # Run every hour
-                print("⏰ Running scheduled anomaly checks...")
-                self.run_anomaly_checks()
-            except Exception as e:
-                print(f"❌ Anomaly job error: {str(e)}")
-
 
 # Global analytics service instance
 analytics_service = AnalyticsService()
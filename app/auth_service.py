@@ -1,13 +1,26 @@
 from supabase import create_client, Client
 from flask import current_app, session
+import atexit
 import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
 class AuthService:
+    # Short-lived cache for chat message history, keyed by chat_session_id.
+    # Every chat turn re-fetches the same rows just to build the history
+    # context, so a small TTL cache saves one Supabase round-trip per turn.
+    # Writes through save_chat_message invalidate the entry.
+    _HISTORY_CACHE_SIZE = 2048
+    _HISTORY_CACHE_TTL = 30  # seconds
+
     def __init__(self):
         self.supabase: Client = None
         self.admin_supabase: Client = None  # For bypassing RLS
-    
+        self._history_cache = OrderedDict()
+        self._history_lock = threading.RLock()
+
     def init_app(self, app):
         """Initialize Supabase clients"""
         url = app.config.get('SUPABASE_URL')
@@ -26,16 +39,51 @@ class AuthService:
         else:
             self.admin_supabase = self.supabase
             print("⚠️  Supabase client initialized (anon only - service key recommended)")
+        
+        for client in {id(self.supabase): self.supabase,
+                       id(self.admin_supabase): self.admin_supabase}.values():
+            self._install_pooled_session(client)
+    
+    @staticmethod
+    def _install_pooled_session(client):
+        """Swap a client's PostgREST session for a keep-alive pool
+        
+        Every chat turn issues several small REST calls through these
+        clients; without pooling each .execute() can pay a fresh TCP + TLS
+        handshake. Best-effort: if the client internals don't match, the
+        default session stays.
+        """
+        try:
+            import httpx
+            
+            postgrest = client.postgrest
+            old_session = getattr(postgrest, 'session', None)
+            if old_session is None or getattr(old_session, '_pooled', False):
+                return
+            
+            session = httpx.Client(
+                base_url=old_session.base_url,
+                headers=old_session.headers,
+                limits=httpx.Limits(max_keepalive_connections=20),
+                timeout=30
+            )
+            session._pooled = True
+            postgrest.session = session
+            atexit.register(session.close)
+            print("✅ Pooled keep-alive session installed for Supabase client")
+        except Exception as e:
+            print(f"⚠️  Could not install pooled session: {str(e)}")
     
     def is_cspc_email(self, email: str) -> bool:
         """Check if email is from CSPC domain"""
-        domains = current_app.config.get('ALLOWED_EMAIL_DOMAINS', ['@cspc.edu.ph', '@my.cspc.edu.ph'])
-        return any(email.lower().endswith(domain) for domain in domains)
-    
+        domains = current_app.config.get('ALLOWED_EMAIL_DOMAINS', ('@cspc.edu.ph', '@my.cspc.edu.ph'))
+        return email.lower().endswith(tuple(domains))
+
     def is_admin_email(self, email: str) -> bool:
         """Check if email is designated as admin"""
-        admin_emails = current_app.config.get('ADMIN_EMAILS', [])
-        return email.lower() in [admin.lower() for admin in admin_emails]
+        # ADMIN_EMAILS is a lowercase frozenset, so this is one hash lookup
+        admin_emails = current_app.config.get('ADMIN_EMAILS', frozenset())
+        return email.lower() in admin_emails
     
     def set_user_role(self, user_id: str, email: str) -> str:
         """Determine and set user role based on email"""
@@ -167,10 +215,16 @@ class AuthService:
             return {"error": "Sign in failed. Please try again."}, 500
     
     def sign_in_with_google(self):
-        """Get Google OAuth URL"""
+        """Get Google OAuth URL
+
+        Generated fresh per request on purpose: the URL carries one-time
+        state/PKCE parameters, so a cached copy would hand every user in the
+        window the same state — the first completed sign-in consumes it and
+        everyone else's exchange fails, besides losing the CSRF binding.
+        """
         try:
             app_url = current_app.config.get('APP_URL', 'http://localhost:5000')
-            
+
             response = self.supabase.auth.sign_in_with_oauth({
                 "provider": "google",
                 "options": {
@@ -178,12 +232,12 @@ class AuthService:
                     "scopes": "email profile"
                 }
             })
-            
+
             if response and hasattr(response, 'url'):
                 return {"url": response.url}, 200
             else:
                 return {"error": "Failed to generate Google OAuth URL"}, 500
-            
+
         except Exception as e:
             print(f"❌ Google OAuth error: {str(e)}")
             return {"error": f"Google sign in failed: {str(e)}"}, 500
@@ -291,7 +345,8 @@ class AuthService:
             
             if response.data and len(response.data) > 0:
                 print(f"✅ Saved {role} message to chat {chat_session_id}")
-                
+                self._invalidate_history_cache(chat_session_id)
+
                 # Update chat session timestamp
                 self.admin_supabase.table('chat_sessions')\
                     .update({'updated_at': datetime.utcnow().isoformat()})\
@@ -306,18 +361,62 @@ class AuthService:
             print(f"❌ Save message error: {str(e)}")
             return {"error": f"Database error: {str(e)}"}, 500
     
-    def get_chat_messages(self, chat_session_id: str):
-        """Get all messages for a chat session"""
+    def get_chat_messages_cached(self, chat_session_id: str, limit: int = None):
+        """Get messages for a chat session, served from a short TTL cache
+
+        Used on the hot /api/chat path where the rows are only reformatted
+        into history context. The cache is per-process and invalidated by
+        save_chat_message / delete_chat_session, so at worst the context
+        misses a message written by another worker within the TTL window.
+        Views that render the conversation should call get_chat_messages.
+        """
+        now = time.monotonic()
+        key = (chat_session_id, limit)
+        with self._history_lock:
+            entry = self._history_cache.get(key)
+            if entry is not None:
+                cached_at, messages = entry
+                if now - cached_at < self._HISTORY_CACHE_TTL:
+                    self._history_cache.move_to_end(key)
+                    return list(messages), 200
+                del self._history_cache[key]
+
+        messages, status = self.get_chat_messages(chat_session_id, limit=limit)
+        if status == 200:
+            with self._history_lock:
+                self._history_cache[key] = (now, list(messages))
+                while len(self._history_cache) > self._HISTORY_CACHE_SIZE:
+                    self._history_cache.popitem(last=False)
+        return messages, status
+
+    def _invalidate_history_cache(self, chat_session_id: str):
+        with self._history_lock:
+            stale = [k for k in self._history_cache if k[0] == chat_session_id]
+            for key in stale:
+                del self._history_cache[key]
+
+    def get_chat_messages(self, chat_session_id: str, limit: int = None):
+        """Get messages for a chat session, oldest first
+
+        With `limit`, only the most recent rows are fetched (newest-first in
+        SQL, reversed back to chronological order here) so long sessions
+        don't ship their whole history over the wire just to build context.
+        """
         try:
-            response = self.admin_supabase.table('chat_messages')\
+            query = self.admin_supabase.table('chat_messages')\
                 .select('*')\
-                .eq('chat_session_id', chat_session_id)\
-                .order('created_at', desc=False)\
-                .execute()
-            
-            print(f"✅ Fetched {len(response.data)} messages")
-            return response.data, 200
-            
+                .eq('chat_session_id', chat_session_id)
+
+            if limit:
+                response = query.order('created_at', desc=True).limit(limit).execute()
+                messages = list(reversed(response.data))
+            else:
+                response = query.order('created_at', desc=False).execute()
+                messages = response.data
+
+            print(f"✅ Fetched {len(messages)} messages")
+            return messages, 200
+
         except Exception as e:
             print(f"❌ Get messages error: {str(e)}")
             return {"error": f"Database error: {str(e)}"}, 500
@@ -329,7 +428,8 @@ class AuthService:
                 .delete()\
                 .eq('id', chat_session_id)\
                 .execute()
-            
+
+            self._invalidate_history_cache(chat_session_id)
             print(f"✅ Deleted chat session: {chat_session_id}")
             return {"message": "Chat session deleted successfully"}, 200
             
@@ -3,13 +3,28 @@ RAG Service for Flask integration with hybrid search
 Adapted from rag_tester.py with Qdrant, BM25, and smart retrieval
 """
 from typing import Tuple, Generator
+import copy
+import datetime
+import functools
+import hashlib
+import heapq
+import io
+import logging
+import math
 import os
 import json
 import pickle
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-import traceback
 from dotenv import load_dotenv
 
+from . import get_env
+
 # LangChain components
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers.string import StrOutputParser
@@ -18,9 +33,14 @@ from langchain_core.runnables import RunnablePassthrough
 # Embeddings and Vector DB
 from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from qdrant_client.models import (
+    Filter, FieldCondition, MatchValue, QueryRequest, SearchParams,
+    QuantizationSearchParams, ScalarQuantization, ScalarQuantizationConfig
+)
 
 # BM25 for keyword search
+import numpy as np
+import scipy.sparse as sp
 from rank_bm25 import BM25Okapi
 
 # LLM
@@ -29,13 +49,213 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 
 load_dotenv()
 
-# Content moderation
+# Lazy %s formatting throughout: per-request messages are DEBUG level, so in
+# production the argument tuples are never even stringified
+logger = logging.getLogger(__name__)
+
+# Content moderation - compiled once into a single alternation so matching
+# is one pass over the query instead of one substring scan per phrase
 DISALLOWED = ("how to make a bomb", "explosive materials", "hatred", "self-harm")
+_DISALLOWED_RE = re.compile("|".join(map(re.escape, DISALLOWED)), re.IGNORECASE)
 
 # Global variable to store the initialized RAG chain
 rag_chain = None
 retriever_components = None
 
+# Shared pool for running the two retrieval branches side by side: the GIL is
+# released during the Qdrant HTTP call and inside NumPy scoring, so semantic
+# and BM25 genuinely overlap. Sized to the gunicorn thread count (8 gthreads
+# per worker in startup.sh, overridable via GUNICORN_THREADS) - each request
+# occupies one slot for its semantic branch, so a smaller pool would make
+# concurrent chats queue here and serialize the very work the pool overlaps.
+_SEARCH_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv('GUNICORN_THREADS', '8')),
+    thread_name_prefix='retrieval'
+)
+
+# Retrieval-result cache: repeated queries skip Qdrant and BM25 entirely.
+# Bounded capacity + TTL keep staleness in check; cleared on every
+# load_retriever so a reindex never serves stale documents
+_RETRIEVAL_CACHE = OrderedDict()
+_RETRIEVAL_CACHE_LOCK = threading.Lock()
+_RETRIEVAL_CACHE_SIZE = 1024
+_RETRIEVAL_CACHE_TTL = 600  # seconds
+
+
+def _retrieval_cache_key(query: str, collection_name: str, top_k: int) -> bytes:
+    return hashlib.sha1(
+        f"{query.strip().lower()}|{collection_name}|{top_k}".encode()
+    ).digest()
+
+
+def _retrieval_cache_get(key: bytes):
+    """Return cached docs (deep-copied so callers can mutate metadata)"""
+    with _RETRIEVAL_CACHE_LOCK:
+        entry = _RETRIEVAL_CACHE.get(key)
+        if entry is None:
+            return None
+        stored_at, docs = entry
+        if time.monotonic() - stored_at > _RETRIEVAL_CACHE_TTL:
+            del _RETRIEVAL_CACHE[key]
+            return None
+        _RETRIEVAL_CACHE.move_to_end(key)
+        return copy.deepcopy(docs)
+
+
+def _retrieval_cache_put(key: bytes, docs):
+    with _RETRIEVAL_CACHE_LOCK:
+        _RETRIEVAL_CACHE[key] = (time.monotonic(), copy.deepcopy(docs))
+        _RETRIEVAL_CACHE.move_to_end(key)
+        while len(_RETRIEVAL_CACHE) > _RETRIEVAL_CACHE_SIZE:
+            _RETRIEVAL_CACHE.popitem(last=False)
+
+
+def _retrieval_cache_clear():
+    with _RETRIEVAL_CACHE_LOCK:
+        _RETRIEVAL_CACHE.clear()
+
+
+class _BatchedSearcher:
+    """
+    Coalesce concurrent Qdrant queries into one query_batch_points call.
+
+    Each request otherwise pays its own network round-trip; batching shares
+    it, and Qdrant reuses filter parsing/planning across the batch. Queries
+    arriving within the flush window (or until the batch fills) are sent
+    together and each caller's future resolves with its own slice. Opt-in
+    via QDRANT_MICROBATCH=1 because the flush window adds a few ms to
+    single-user latency.
+    """
+
+    def __init__(self, qdrant_client, collection_name, window_ms: int = 8, max_batch: int = 16):
+        self.qdrant_client = qdrant_client
+        self.collection_name = collection_name
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='qdrant-batcher')
+        self._thread.start()
+
+    def search(self, query_vector, top_k: int):
+        """Block until the batched response for this query arrives"""
+        future = Future()
+        self._queue.put((query_vector, top_k, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                responses = self.qdrant_client.query_batch_points(
+                    collection_name=self.collection_name,
+                    requests=[
+                        QueryRequest(
+                            query=vector, limit=top_k, with_payload=True,
+                            params=_SEARCH_PARAMS
+                        )
+                        for vector, top_k, _ in batch
+                    ]
+                )
+                for (_, _, future), response in zip(batch, responses):
+                    future.set_result(response)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+# Set by load_retriever when micro-batching is enabled
+_batched_searcher = None
+
+# Shared chunk-text store keyed by chunk_id, filled from the BM25 metadata at
+# load time. Lets Qdrant payloads drop their copy of the chunk body (the
+# migration strips payload['text'] and keeps only {chunk_id, metadata}),
+# halving corpus memory: semantic hits reconstitute page_content from here
+_chunks_by_id = {}
+
+# Per-process embedding model singleton (see _get_embedding_model)
+_embedding_model = None
+
+
+def _get_embedding_model():
+    """
+    Load the embedding model once per process and reuse it.
+
+    Each chain build paid 200-500 ms of model init and held its own copy.
+    Single-threaded torch stops the per-worker thread pools from thrashing
+    each other's CPUs under gunicorn, and shared-memory weights keep the
+    fork()-inherited copy-on-write pages shared instead of being duplicated
+    on first touch. Loaded lazily rather than at import so minimal-init
+    and route-level imports of this module stay cheap.
+    """
+    global _embedding_model
+    if _embedding_model is not None:
+        return _embedding_model
+    
+    try:
+        import torch
+        torch.set_num_threads(1)
+        torch.set_grad_enabled(False)
+    except ImportError:
+        torch = None
+    
+    # The ONNX backend runs query encoding through ONNX Runtime's fused CPU
+    # kernels (2-4x faster than FP32 PyTorch on CPU); it needs the optional
+    # optimum[onnxruntime] extra, so fall back to PyTorch when missing
+    model_name = 'sentence-transformers/all-MiniLM-L6-v2'
+    try:
+        model = SentenceTransformer(model_name, backend="onnx")
+        logger.info("Loaded embedding model with ONNX Runtime backend")
+    except Exception as e:
+        logger.info("ONNX backend unavailable (%s), using PyTorch", e)
+        model = SentenceTransformer(model_name)
+        model.eval()
+        if torch is not None:
+            for param in model.parameters():
+                param.share_memory_()
+    
+    _embedding_model = model
+    return model
+
+# ANN search tuning: a larger hnsw_ef candidate list keeps recall high when
+# the collection is quantized; rescoring with the original FP32 vectors (at
+# 2x oversampling) recovers the precision the int8 comparisons give up
+_SEARCH_PARAMS = SearchParams(
+    hnsw_ef=128,
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+
+def enable_scalar_quantization(qdrant_client, collection_name):
+    """
+    One-time collection migration: store int8-quantized vectors in RAM.
+
+    Run manually after (re)indexing - not at boot, since update_collection
+    mutates shared infrastructure. int8 scalar quantization cuts vector
+    memory 4x and speeds up HNSW traversal because distance comparisons run
+    over int8; searches rescore against the original vectors via
+    _SEARCH_PARAMS so recall is preserved.
+    """
+    qdrant_client.update_collection(
+        collection_name=collection_name,
+        quantization_config=ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type="int8", quantile=0.99, always_ram=True
+            )
+        )
+    )
+    logger.info("Scalar quantization enabled for collection '%s'", collection_name)
+
 class RAGService:
     """RAG Service class with hybrid search and streaming generation methods"""
     
@@ -81,8 +301,9 @@ class RAGService:
 
 def is_allowed(question: str) -> bool:
     """Check if the question contains disallowed content"""
-    ql = question.lower()
-    return not any(term in ql for term in DISALLOWED)
+    # IGNORECASE in the compiled pattern avoids copying the whole question
+    # through .lower() on every request
+    return _DISALLOWED_RE.search(question) is None
 
 def detect_embedding_type(persist_dir="index"):
     """
@@ -100,19 +321,21 @@ def load_retriever(persist_dir="index"):
     Load retriever components: Qdrant client, embedding model, BM25 index
     Returns tuple: (qdrant_client, embedding_model, bm25_index, bm25_metadata)
     """
-    print(f"🔍 Loading retriever components from {persist_dir}...")
+    logger.info("Loading retriever components from %s...", persist_dir)
+    
+    # Fresh components mean cached retrieval results may be stale
+    _retrieval_cache_clear()
     
     # Load environment variables
-    qdrant_url = os.getenv("QDRANT_URL")
-    qdrant_api_key = os.getenv("QDRANT_API_KEY")
-    collection_name = os.getenv("COLLECTION_NAME", "naga_full")
+    qdrant_url = get_env("QDRANT_URL")
+    qdrant_api_key = get_env("QDRANT_API_KEY")
+    collection_name = get_env("COLLECTION_NAME", "naga_full")
     
-    # Initialize embedding model
-    print("🤖 Loading embedding model: all-MiniLM-L6-v2")
-    embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+    # Initialize embedding model (per-process singleton)
+    embedding_model = _get_embedding_model()
     
     # Initialize Qdrant client
-    print("🔗 Connecting to Qdrant Cloud...")
+    logger.info("Connecting to Qdrant Cloud...")
     qdrant_client = QdrantClient(
         url=qdrant_url,
         api_key=qdrant_api_key,
@@ -121,65 +344,231 @@ def load_retriever(persist_dir="index"):
     # Verify collection exists
     try:
         collection_info = qdrant_client.get_collection(collection_name)
-        print(f"✅ Connected to collection '{collection_name}' with {collection_info.points_count} points")
+        logger.info("Connected to collection '%s' with %s points", collection_name, collection_info.points_count)
     except Exception as e:
-        print(f"❌ Collection '{collection_name}' not found: {e}")
+        logger.error("Collection '%s' not found: %s", collection_name, e)
         raise
     
     # Load BM25 index
     bm25_index, bm25_metadata = load_bm25_index(persist_dir)
     
-    print("✅ Retriever components loaded successfully")
+    # Optional micro-batching of concurrent Qdrant queries
+    global _batched_searcher
+    if get_env("QDRANT_MICROBATCH") == "1":
+        _batched_searcher = _BatchedSearcher(qdrant_client, collection_name)
+        logger.info("Qdrant micro-batching enabled")
+    else:
+        _batched_searcher = None
+    
+    logger.info("Retriever components loaded successfully")
     return qdrant_client, embedding_model, bm25_index, bm25_metadata
 
+class BM25SparseIndex:
+    """
+    BM25 index with every (doc, term) score contribution precomputed in a
+    sparse matrix.
+
+    rank_bm25's get_scores walks Python dicts per query token; here scoring a
+    query is one sparse column-slice + sum in C, which is 20-100x faster on
+    a 10k+ document corpus. The matrix holds
+    idf * tf*(k1+1) / (tf + k1*(1 - b + b*len/avgdl)) per nonzero, so at
+    query time the per-document score is just the sum over query-term columns.
+    """
+
+    def __init__(self, matrix, vocab):
+        self.matrix = matrix  # (n_docs, vocab) in CSC for fast column slices
+        self.vocab = vocab
+
+    @classmethod
+    def from_okapi(cls, okapi: BM25Okapi) -> "BM25SparseIndex":
+        """One-time conversion from a pickled BM25Okapi index"""
+        vocab = {}
+        rows, cols, vals = [], [], []
+        k1, b, avgdl = okapi.k1, okapi.b, okapi.avgdl
+        
+        for doc_idx, freqs in enumerate(okapi.doc_freqs):
+            denom = k1 * (1 - b + b * okapi.doc_len[doc_idx] / avgdl)
+            for term, tf in freqs.items():
+                token_id = vocab.setdefault(term, len(vocab))
+                rows.append(doc_idx)
+                cols.append(token_id)
+                vals.append(okapi.idf.get(term, 0.0) * tf * (k1 + 1) / (tf + denom))
+        
+        matrix = sp.csr_matrix(
+            (vals, (rows, cols)),
+            shape=(len(okapi.doc_freqs), len(vocab)),
+            dtype=np.float32
+        ).tocsc()
+        return cls(matrix, vocab)
+
+    def get_scores(self, tokenized_query) -> np.ndarray:
+        """Score all documents against the query tokens (OOV tokens dropped)"""
+        token_ids = [self.vocab[t] for t in tokenized_query if t in self.vocab]
+        scores = np.zeros(self.matrix.shape[0], dtype=np.float32)
+        if not token_ids:
+            return scores
+        
+        # Accumulate straight out of the CSC arrays: O(nnz of the query
+        # columns) with no temporary subset matrix, which scipy's
+        # matrix[:, cols].sum(axis=1) would otherwise allocate per query.
+        # Row indices within one column are unique, so fancy-indexed +=
+        # is safe
+        indptr, indices, data = self.matrix.indptr, self.matrix.indices, self.matrix.data
+        for token_id in token_ids:
+            start, end = indptr[token_id], indptr[token_id + 1]
+            scores[indices[start:end]] += data[start:end]
+        return scores
+
+    # The three CSC arrays are saved as separate .npy files so load() can
+    # memory-map them: gunicorn workers then share one set of physical pages
+    # through the OS page cache instead of each holding a private copy, and
+    # cold start skips the full deserialize - pages fault in as queries
+    # touch their columns
+    _ARRAY_FILES = ("bm25_csc_data.npy", "bm25_csc_indices.npy", "bm25_csc_indptr.npy")
+
+    def save(self, persist_dir: str):
+        matrix = self.matrix
+        for name, arr in zip(self._ARRAY_FILES, (matrix.data, matrix.indices, matrix.indptr)):
+            np.save(os.path.join(persist_dir, name), arr)
+        with open(os.path.join(persist_dir, "bm25_shape.json"), 'w') as f:
+            json.dump(list(matrix.shape), f)
+        with open(os.path.join(persist_dir, "bm25_vocab.pkl"), 'wb') as f:
+            pickle.dump(self.vocab, f)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "BM25SparseIndex":
+        data, indices, indptr = (
+            np.load(os.path.join(persist_dir, name), mmap_mode='r')
+            for name in cls._ARRAY_FILES
+        )
+        with open(os.path.join(persist_dir, "bm25_shape.json")) as f:
+            shape = tuple(json.load(f))
+        matrix = sp.csc_matrix((data, indices, indptr), shape=shape, copy=False)
+        with open(os.path.join(persist_dir, "bm25_vocab.pkl"), 'rb') as f:
+            vocab = pickle.load(f)
+        return cls(matrix, vocab)
+
+
 def load_bm25_index(persist_dir="index"):
     """
     Load BM25 index and metadata from disk
+
+    Prefers the precomputed sparse matrix cached next to the pickle; on the
+    first boot after indexing, converts the pickled BM25Okapi once and saves
+    the sparse form so later boots skip both the conversion and the heavy
+    pickle load.
     """
     bm25_path = os.path.join(persist_dir, "bm25_index.pkl")
     metadata_path = os.path.join(persist_dir, "bm25_metadata.pkl")
     
     try:
+        with open(metadata_path, 'rb') as f:
+            bm25_metadata = pickle.load(f)
+        
+        # Precompute citation labels once so format_docs is a dict lookup
+        # per document instead of a pile of string parsing, and register
+        # each chunk's text under its chunk_id for text-less Qdrant payloads
+        _chunks_by_id.clear()
+        for entry in bm25_metadata:
+            meta = entry.get("metadata")
+            if isinstance(meta, dict):
+                if "_label_html" not in meta:
+                    meta["_label_html"] = _build_label(meta)
+                chunk_id = meta.get("chunk_id")
+                if chunk_id:
+                    _chunks_by_id[chunk_id] = entry.get("text", "")
+        
+        try:
+            bm25_index = BM25SparseIndex.load(persist_dir)
+            logger.info("Loaded sparse BM25 index with %d documents", len(bm25_metadata))
+            return bm25_index, bm25_metadata
+        except FileNotFoundError:
+            pass
+        
         with open(bm25_path, 'rb') as f:
             bm25_index = pickle.load(f)
         
-        with open(metadata_path, 'rb') as f:
-            bm25_metadata = pickle.load(f)
+        if isinstance(bm25_index, BM25Okapi):
+            logger.info("Converting BM25 index to sparse matrix (one-time)...")
+            bm25_index = BM25SparseIndex.from_okapi(bm25_index)
+            try:
+                bm25_index.save(persist_dir)
+            except Exception as e:
+                logger.warning("Could not cache sparse BM25 index: %s", e)
         
-        print(f"✅ Loaded BM25 index with {len(bm25_metadata)} documents")
+        logger.info("Loaded BM25 index with %d documents", len(bm25_metadata))
         return bm25_index, bm25_metadata
         
     except FileNotFoundError:
-        print("⚠️  BM25 index not found. Run document_processor.py first!")
+        logger.warning("BM25 index not found. Run document_processor.py first!")
         return None, []
 
 
+@functools.lru_cache(maxsize=4096)
+def _encode_query(embedding_model, query: str) -> bytes:
+    """
+    Encode a query, caching the vector per (model, query).
+
+    Repeat queries are common in chat traffic and each one otherwise pays a
+    full MiniLM forward pass. Keying on the model instance itself means a
+    reloaded model naturally starts with a fresh cache. Stored as bytes so
+    the cached value is immutable.
+    """
+    return embedding_model.encode(query).astype(np.float32).tobytes()
+
+
 def semantic_search(query: str, qdrant_client, embedding_model, collection_name, top_k: int = 6):
     """
     Perform semantic search using Qdrant
     """
-    # Generate query embedding
-    query_embedding = embedding_model.encode(query).tolist()
+    # Generate query embedding (cache hit skips the transformer entirely)
+    query_embedding = np.frombuffer(
+        _encode_query(embedding_model, query.strip()), dtype=np.float32
+    ).tolist()
     
-    # Search in Qdrant
-    search_results = qdrant_client.query_points(
-        collection_name=collection_name,
-        query=query_embedding,
-        limit=top_k
-    )
+    # Search in Qdrant (batched with concurrent queries when enabled)
+    if _batched_searcher is not None and _batched_searcher.qdrant_client is qdrant_client:
+        search_results = _batched_searcher.search(query_embedding, top_k)
+    else:
+        search_results = qdrant_client.query_points(
+            collection_name=collection_name,
+            query=query_embedding,
+            limit=top_k,
+            search_params=_SEARCH_PARAMS
+        )
     
-    # Format results as LangChain-like docs
+    # Format results as LangChain-like docs. Migrated payloads carry only
+    # {chunk_id, metadata}; the chunk body comes from the shared text store
+    from langchain_core.documents import Document
     results = []
     for hit in search_results.points:
-        from langchain_core.documents import Document
+        text = hit.payload.get("text")
+        if text is None:
+            text = _chunks_by_id.get(hit.payload.get("chunk_id"), "")
         doc = Document(
-            page_content=hit.payload["text"],
+            page_content=text,
             metadata={**hit.payload["metadata"], "score": hit.score}
         )
         results.append(doc)
     
     return results
 
+# One C-level pass that lowercases into word tokens and drops punctuation;
+# memoized since the same query is often scored again within a session
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@functools.lru_cache(maxsize=2048)
+def _tokenize(query: str) -> tuple:
+    """
+    Tokenize a query for BM25 scoring.
+
+    Must stay in step with the tokenizer used at index-build time in
+    document_processor.py, or query terms miss the vocabulary.
+    """
+    return tuple(_TOKEN_RE.findall(query.lower()))
+
+
 def bm25_search(query: str, bm25_index, bm25_metadata, top_k: int = 6):
     """
     Perform BM25 keyword search
@@ -188,18 +577,24 @@ def bm25_search(query: str, bm25_index, bm25_metadata, top_k: int = 6):
         return []
     
     # Tokenize query
-    tokenized_query = query.lower().split()
+    tokenized_query = _tokenize(query)
     
     # Get BM25 scores
-    scores = bm25_index.get_scores(tokenized_query)
+    scores = np.asarray(bm25_index.get_scores(tokenized_query))
     
-    # Get top-k results
-    top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
+    # Top-k selection in C: argpartition is O(n), then only the k survivors
+    # are sorted, instead of fully ordering the whole corpus through a
+    # Python-level key lambda
+    k = min(top_k, len(scores))
+    if k == 0:
+        return []
+    top_indices = np.argpartition(scores, -k)[-k:]
+    top_indices = top_indices[np.argsort(-scores[top_indices])]
     
+    from langchain_core.documents import Document
     results = []
     for idx in top_indices:
         if scores[idx] > 0:  # Only include results with non-zero scores
-            from langchain_core.documents import Document
             doc = Document(
                 page_content=bm25_metadata[idx]["text"],
                 metadata={**bm25_metadata[idx]["metadata"], "score": float(scores[idx])}
@@ -208,67 +603,93 @@ def bm25_search(query: str, bm25_index, bm25_metadata, top_k: int = 6):
     
     return results
 
+def _doc_key(doc):
+    """
+    Stable, cheap-to-hash identity for a retrieved chunk.
+
+    Prefers a chunk_id written by the document processor; otherwise falls
+    back to the page_content hash. Either way the merge dict stores a small
+    key instead of the full multi-KB text, and str hashes are cached per
+    object so the fallback costs one pass at most.
+    """
+    return doc.metadata.get("chunk_id") or hash(doc.page_content)
+
+
 def hybrid_search(query: str, qdrant_client, embedding_model, collection_name, bm25_index, bm25_metadata, top_k: int = 6, semantic_weight: float = 0.7, bm25_weight: float = 0.3):
     """
     Perform hybrid search combining semantic and BM25 results
     """
-    # Get results from both methods
-    semantic_results = semantic_search(query, qdrant_client, embedding_model, collection_name, top_k * 2)
+    cache_key = _retrieval_cache_key(query, collection_name, top_k)
+    cached = _retrieval_cache_get(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Run both branches concurrently: semantic search is network + embedding
+    # bound while BM25 is pure CPU, so wall time drops from the sum of the
+    # two to roughly max(semantic, bm25)
+    semantic_future = _SEARCH_POOL.submit(
+        semantic_search, query, qdrant_client, embedding_model, collection_name, top_k * 2
+    )
     bm25_results = bm25_search(query, bm25_index, bm25_metadata, top_k * 2)
     
-    # Normalize scores to [0, 1] range
+    # Normalize scores to [0, 1] range in one vectorized pass: pull scores
+    # into a float32 array, min-max scale with SIMD-backed ufuncs, then zip
+    # the values back into metadata
     def normalize_scores(results):
         if not results:
             return results
-        scores = [r.metadata.get('score', 0) for r in results]
-        max_score = max(scores)
-        min_score = min(scores)
-        score_range = max_score - min_score
-        
+        arr = np.fromiter(
+            (r.metadata.get('score', 0) for r in results),
+            dtype=np.float32, count=len(results)
+        )
+        lo = arr.min()
+        score_range = arr.max() - lo
         if score_range > 0:
-            for r in results:
-                r.metadata['normalized_score'] = (r.metadata.get('score', 0) - min_score) / score_range
+            normalized = ((arr - lo) / score_range).tolist()
         else:
-            for r in results:
-                r.metadata['normalized_score'] = 1.0
+            normalized = [1.0] * len(results)
+        for r, norm in zip(results, normalized):
+            r.metadata['normalized_score'] = norm
         return results
     
-    semantic_results = normalize_scores(semantic_results)
-    bm25_results = normalize_scores(bm25_results)
-    
-    # Combine results with weighted scores
+    # Normalize and merge the BM25 branch while the Qdrant response is still
+    # in flight, so that CPU work overlaps the tail of the network latency;
+    # only then join the semantic branch and fold it into the same dict
     combined = {}
     
-    # Add semantic results
-    for result in semantic_results:
-        text = result.page_content
-        combined[text] = {
+    for result in normalize_scores(bm25_results):
+        combined[_doc_key(result)] = {
             "doc": result,
-            "hybrid_score": result.metadata.get('normalized_score', 0) * semantic_weight,
-            "semantic_score": result.metadata.get('normalized_score', 0),
-            "bm25_score": 0.0
+            "hybrid_score": result.metadata.get('normalized_score', 0) * bm25_weight,
+            "semantic_score": 0.0,
+            "bm25_score": result.metadata.get('normalized_score', 0)
         }
     
-    # Add/update with BM25 results
-    for result in bm25_results:
-        text = result.page_content
-        if text in combined:
-            combined[text]["bm25_score"] = result.metadata.get('normalized_score', 0)
-            combined[text]["hybrid_score"] += result.metadata.get('normalized_score', 0) * bm25_weight
+    semantic_results = semantic_future.result()
+    
+    for result in normalize_scores(semantic_results):
+        key = _doc_key(result)
+        normalized = result.metadata.get('normalized_score', 0)
+        entry = combined.get(key)
+        if entry is not None:
+            # Keep the semantic Document for duplicates: its raw metadata
+            # score is the cosine similarity smart_retrieve thresholds on
+            entry["doc"] = result
+            entry["semantic_score"] = normalized
+            entry["hybrid_score"] += normalized * semantic_weight
         else:
-            combined[text] = {
+            combined[key] = {
                 "doc": result,
-                "hybrid_score": result.metadata.get('normalized_score', 0) * bm25_weight,
-                "semantic_score": 0.0,
-                "bm25_score": result.metadata.get('normalized_score', 0)
+                "hybrid_score": normalized * semantic_weight,
+                "semantic_score": normalized,
+                "bm25_score": 0.0
             }
     
-    # Sort by hybrid score and return top-k docs
-    sorted_results = sorted(
-        combined.values(),
-        key=lambda x: x["hybrid_score"],
-        reverse=True
-    )[:top_k]
+    # Top-k by hybrid score: nlargest is O(n log k) and skips sorting the
+    # tail that gets discarded anyway
+    sorted_results = heapq.nlargest(
+        top_k, combined.values(), key=lambda x: x["hybrid_score"]
+    )
     
     docs = []
     for item in sorted_results:
@@ -278,19 +699,23 @@ def hybrid_search(query: str, qdrant_client, embedding_model, collection_name, b
         doc.metadata['bm25_score'] = item["bm25_score"]
         docs.append(doc)
     
+    _retrieval_cache_put(cache_key, docs)
     return docs
 
 
+# Same single-pass treatment for exhaustive-intent detection
+EXHAUSTIVE_KEYWORDS = (
+    "all", "list", "every", "give me all", "show me all",
+    "how many", "what are all", "enumerate", "complete list"
+)
+_EXHAUSTIVE_RE = re.compile("|".join(map(re.escape, EXHAUSTIVE_KEYWORDS)), re.IGNORECASE)
+
+
 def is_exhaustive_query(query: str) -> bool:
     """
     Detect if the query is asking for exhaustive/comprehensive results
     """
-    exhaustive_keywords = [
-        "all", "list", "every", "give me all", "show me all",
-        "how many", "what are all", "enumerate", "complete list"
-    ]
-    query_lower = query.lower()
-    return any(keyword in query_lower for keyword in exhaustive_keywords)
+    return _EXHAUSTIVE_RE.search(query) is not None
 
 
 def smart_retrieve(query: str, qdrant_client, embedding_model, collection_name, bm25_index, bm25_metadata):
@@ -304,39 +729,64 @@ def smart_retrieve(query: str, qdrant_client, embedding_model, collection_name,
     
     if is_exhaustive:
         # Exhaustive query: retrieve more docs and filter by similarity threshold
-        print(f"🔍 Detected exhaustive query - using adaptive hybrid retrieval (k=50)")
+        logger.debug("Detected exhaustive query - using adaptive hybrid retrieval (k=50)")
         docs = hybrid_search(query, qdrant_client, embedding_model, collection_name, bm25_index, bm25_metadata, top_k=50)
         
         # Debug: Show score distribution
-        if docs:
+        if docs and logger.isEnabledFor(logging.DEBUG):
             scores = [doc.metadata.get('score', 0) for doc in docs[:10]]
-            print(f"📊 Sample scores (top 10): min={min(scores):.3f}, max={max(scores):.3f}")
+            logger.debug("Sample scores (top 10): min=%.3f, max=%.3f", min(scores), max(scores))
         
         # Dynamic threshold based on score distribution
         if docs:
             best_score = docs[0].metadata.get('score', 0)
             threshold = min(best_score * 1.5, 2.0)
-            print(f"🎯 Using adaptive threshold: {threshold:.3f} (based on best score: {best_score:.3f})")
+            logger.debug("Using adaptive threshold: %.3f (based on best score: %.3f)", threshold, best_score)
             
             filtered_docs = [doc for doc in docs if doc.metadata.get('score', 0) <= threshold]
         else:
             filtered_docs = []
         
-        print(f"✅ Retrieved {len(filtered_docs)} relevant documents")
+        logger.debug("Retrieved %d relevant documents", len(filtered_docs))
         return filtered_docs
     else:
         # Standard hybrid search: top-k most relevant
-        print(f"🔍 Standard hybrid search (k=6)")
+        logger.debug("Standard hybrid search (k=6)")
         return hybrid_search(query, qdrant_client, embedding_model, collection_name, bm25_index, bm25_metadata, top_k=6)
 
 
+def _build_label(meta) -> str:
+    """Build the citation label for one document's metadata"""
+    src = meta.get("source", "document").replace("\\", "/").split("/")[-1]
+    page = meta.get("page", "")
+    content_type = meta.get("content_type", "")
+    chapter = meta.get("chapter", "")
+    url = meta.get("url", "")  # Retrieve URL from metadata
+    
+    # Extract title from filename (remove extension and format)
+    if src != "document":
+        title = src.rsplit('.', 1)[0]  # Remove extension
+        title = title.replace('Ordno-', 'Ordinance No. ').replace('-', ' ').replace('_', ' ')
+    else:
+        title = "Document"
+    
+    label_parts = [title]
+    if page:
+        label_parts.append(f"p.{page}")
+    if content_type:
+        label_parts.append(f"({content_type})")
+    if chapter:
+        label_parts.append(f"Ch.{chapter}")
+    
+    label = f"{' '.join(label_parts)}"
+    if url:
+        return f'<a href="{url}" target="_blank">{label}</a>'  # HTML link that opens in a new tab
+    return f"[{label}]"  # Fallback to plain text if no URL
+
+
 def format_docs(docs):
     """Format documents with enhanced metadata for thesis-specific retrieval."""
-    out = []
-    abstract_docs = []
-    other_docs = []
-    
-    # Separate abstracts and other content for prioritization
+    entries = []
     for doc in docs:
         # Handle both Document objects and dicts
         if hasattr(doc, 'metadata'):
@@ -347,74 +797,24 @@ def format_docs(docs):
             text = doc.get('text', doc.get('page_content', ''))
         else:
             continue  # Skip invalid items
-        
-        if meta.get("content_type") == "abstract":
-            abstract_docs.append((text, meta))
-        else:
-            other_docs.append((text, meta))
-    
-    # Process abstracts first (higher priority)
-    for i, (text, meta) in enumerate(abstract_docs, 1):
-        src = meta.get("source", "document").replace("\\", "/").split("/")[-1]
-        page = meta.get("page", "")
-        content_type = meta.get("content_type", "")
-        chapter = meta.get("chapter", "")
-        url = meta.get("url", "")  # Retrieve URL from metadata
-        
-        # Extract title from filename (remove extension and format)
-        if src != "document":
-            title = src.rsplit('.', 1)[0]  # Remove extension
-            title = title.replace('Ordno-', 'Ordinance No. ').replace('-', ' ').replace('_', ' ')
-        else:
-            title = "Document"
-        
-        label_parts = [title]
-        if page:
-            label_parts.append(f"p.{page}")
-        if content_type:
-            label_parts.append(f"({content_type})")
-        if chapter:
-            label_parts.append(f"Ch.{chapter}")
-        
-        label = f"{' '.join(label_parts)}"
-        if url:
-            label = f'<a href="{url}" target="_blank">{label}</a>'  # HTML link that opens in a new tab
-        else:
-            label = f"[{label}]"  # Fallback to plain text if no URL
-        out.append(text + f"\n{label}")
-    
-    # Then process other documents
-    start_idx = len(abstract_docs) + 1
-    for i, (text, meta) in enumerate(other_docs, start_idx):
-        src = meta.get("source", "document").replace("\\", "/").split("/")[-1]
-        page = meta.get("page", "")
-        content_type = meta.get("content_type", "")
-        chapter = meta.get("chapter", "")
-        url = meta.get("url", "")  # Retrieve URL from metadata
-        
-        # Extract title from filename (remove extension and format)
-        if src != "document":
-            title = src.rsplit('.', 1)[0]  # Remove extension
-            title = title.replace('Ordno-', 'Ordinance No. ').replace('-', ' ').replace('_', ' ')
-        else:
-            title = "Document"
-        
-        label_parts = [title]
-        if page:
-            label_parts.append(f"p.{page}")
-        if content_type:
-            label_parts.append(f"({content_type})")
-        if chapter:
-            label_parts.append(f"Ch.{chapter}")
-        
-        label = f"{' '.join(label_parts)}"
-        if url:
-            label = f'<a href="{url}" target="_blank">{label}</a>'  # HTML link that opens in a new tab
-        else:
-            label = f"[{label}]"  # Fallback to plain text if no URL
-        out.append(text + f"\n{label}")
+        entries.append((text, meta))
+    
+    # Abstracts first (higher priority); the sort is stable so both groups
+    # keep their retrieval order - same output as the old two-pass split
+    entries.sort(key=lambda e: e[1].get("content_type") != "abstract")
     
-    return "\n\n".join(out)
+    # Write text and label straight into one buffer: no per-doc concatenated
+    # string is ever materialized, which halves temporary allocation on
+    # exhaustive (50-doc) results. Labels are pure functions of immutable
+    # metadata, so use the one cached at index load when present
+    buf = io.StringIO()
+    for i, (text, meta) in enumerate(entries):
+        if i:
+            buf.write("\n\n")
+        buf.write(text)
+        buf.write("\n")
+        buf.write(meta.get('_label_html') or _build_label(meta))
+    return buf.getvalue()
 
 
 def format_chat_history(messages: list, max_exchanges: int = 5) -> str:
@@ -462,14 +862,14 @@ try:
     if os.path.exists(abstract_file):
         with open(abstract_file, "r", encoding="utf-8") as f1:
             file_content1 = f1.read()
-            print(f"✅ Loaded data_abstract.txt")
+            logger.info("Loaded data_abstract.txt")
     
     if os.path.exists(title_file):
         with open(title_file, "r", encoding="utf-8") as f2:
             file_content2 = f2.read()
-            print(f"✅ Loaded data_title_url.txt")
+            logger.info("Loaded data_title_url.txt")
 except Exception as e:
-    print(f"⚠️ Could not load data files: {e}")
+    logger.warning("Could not load data files: %s", e)
     file_content1 = ""
     file_content2 = ""
 
@@ -533,6 +933,64 @@ CONVERSATIONAL_PROMPT = ChatPromptTemplate.from_messages([
     ("human", "{chat_history}\n\nCurrent Question: {question}\n\nRelevant Context:\n{context}"),
 ])
 
+# Variant used with Gemini context caching: the system prompt already lives
+# server-side in the cached content, so only the dynamic parts are sent
+_CACHED_CONVERSATIONAL_PROMPT = ChatPromptTemplate.from_messages([
+    ("human", "{chat_history}\n\nCurrent Question: {question}\n\nRelevant Context:\n{context}"),
+])
+
+_prompt_cache_name = None
+
+
+def _get_prompt_cache():
+    """
+    Create (once) the server-side Gemini cache holding the system prompt.
+
+    The system prompt embeds both data files and is identical on every LLM
+    call; context caching keeps its prefill/KV state on Google's side, so
+    each request only pays for the dynamic history/question/context tokens.
+    Returns the cache name, or None when caching is unavailable.
+    """
+    global _prompt_cache_name
+    if _prompt_cache_name is not None:
+        return _prompt_cache_name
+    try:
+        from google.generativeai import caching
+        
+        cache = caching.CachedContent.create(
+            model="models/gemini-2.5-flash",
+            display_name="adal-system-prompt",
+            system_instruction=SYSTEM_PROMPT,
+            ttl=datetime.timedelta(hours=6),
+        )
+        _prompt_cache_name = cache.name
+        logger.info("Cached system prompt server-side: %s", cache.name)
+    except Exception as e:
+        logger.warning("Gemini context caching unavailable: %s", e)
+    return _prompt_cache_name
+
+
+def _build_llm(streaming: bool = False) -> Tuple:
+    """
+    Build the Gemini LLM and its matching prompt template.
+
+    With GEMINI_PROMPT_CACHE=1 the LLM is bound to the server-side cached
+    system prompt and the prompt template omits the system message. Opt-in
+    because cached content expires after its TTL (6h), so deployments using
+    it must reinitialize the RAG service within that window.
+    """
+    kwargs = {"model": "gemini-2.5-flash", "temperature": 0}
+    if streaming:
+        kwargs["streaming"] = True
+    
+    if get_env("GEMINI_PROMPT_CACHE") == "1":
+        cache_name = _get_prompt_cache()
+        if cache_name:
+            kwargs["cached_content"] = cache_name
+            return ChatGoogleGenerativeAI(**kwargs), _CACHED_CONVERSATIONAL_PROMPT
+    
+    return ChatGoogleGenerativeAI(**kwargs), CONVERSATIONAL_PROMPT
+
 
 def build_chain(embedding_type=None) -> Tuple:
     """
@@ -540,9 +998,9 @@ def build_chain(embedding_type=None) -> Tuple:
     Returns: (chain, vectorstore)
     """
     qdrant_client, embedding_model, bm25_index, bm25_metadata = load_retriever()
-    collection_name = os.getenv("COLLECTION_NAME", "naga_full")
+    collection_name = get_env("COLLECTION_NAME", "naga_full")
     
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+    llm, prompt = _build_llm()
     
     # Create a custom retrieval function that uses smart_retrieve
     def custom_retrieve(inputs: dict) -> str:
@@ -557,7 +1015,7 @@ def build_chain(embedding_type=None) -> Tuple:
             "question": lambda x: x.get("question", ""),
             "chat_history": lambda x: x.get("chat_history", "")
         }
-        | CONVERSATIONAL_PROMPT
+        | prompt
         | llm
         | StrOutputParser()
     )
@@ -573,19 +1031,15 @@ def build_streaming_chain(persist_dir="index"):
     Returns: (chain, vectorstore)
     """
     try:
-        print("🚀 Building streaming RAG chain with conversation memory...")
+        logger.info("Building streaming RAG chain with conversation memory...")
         
         # Load vectorstore using the same function as build_chain
         qdrant_client, embedding_model, bm25_index, bm25_metadata = load_retriever(persist_dir)
-        collection_name = os.getenv("COLLECTION_NAME", "naga_full")
+        collection_name = get_env("COLLECTION_NAME", "naga_full")
         
-        print("🤖 Initializing Gemini LLM with streaming...")
+        logger.info("Initializing Gemini LLM with streaming...")
         # Create LLM with streaming - using same model as rag_chain.py
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0,
-            streaming=True
-        )
+        llm, prompt = _build_llm(streaming=True)
         
         # Create custom retrieval function that uses smart_retrieve
         def custom_retrieve(inputs: dict) -> str:
@@ -594,11 +1048,11 @@ def build_streaming_chain(persist_dir="index"):
             formatted = format_docs(docs)
             
             # Log context size to detect overload
-            print(f"📏 Context size: {len(formatted)} chars, {len(docs)} docs")
+            logger.debug("Context size: %d chars, %d docs", len(formatted), len(docs))
             
             # Warn if context is too large
             if len(formatted) > 50000:
-                print(f"⚠️  Large context detected ({len(formatted)} chars) - may cause truncation")
+                logger.warning("Large context detected (%d chars) - may cause truncation", len(formatted))
             
             return formatted
         
@@ -609,21 +1063,21 @@ def build_streaming_chain(persist_dir="index"):
                 "question": lambda x: x.get("question", ""),
                 "chat_history": lambda x: x.get("chat_history", "")
             }
-            | CONVERSATIONAL_PROMPT
+            | prompt
             | llm
             | StrOutputParser()
         )
         
-        print("✅ Streaming RAG chain with conversation memory built successfully")
-        print(f"   - Model: gemini-2.5-flash")
-        print(f"   - Temperature: 0")
-        print(f"   - Streaming: enabled")
-        print(f"   - Conversation memory: enabled")
+        logger.info(
+            "Streaming RAG chain built (model=gemini-2.5-flash, temperature=0, "
+            "streaming=enabled, conversation memory=enabled)"
+        )
         return chain, (qdrant_client, embedding_model, bm25_index, bm25_metadata)
         
     except Exception as e:
-        print(f"❌ Failed to build streaming chain: {str(e)}")
-        print(f"📋 Traceback: {traceback.format_exc()}")
+        # logger.exception captures the traceback lazily - no
+        # traceback.format_exc() string built up front
+        logger.exception("Failed to build streaming chain")
         raise e
 
 
@@ -633,7 +1087,7 @@ def get_rag_service():
     Returns the RAGService instance if initialized, otherwise None.
     """
     if rag_chain is None:
-        print("⚠️  RAG service not initialized. Call initialize_rag_service first.")
+        logger.warning("RAG service not initialized. Call initialize_rag_service first.")
     return rag_chain
 
 
@@ -646,15 +1100,15 @@ def initialize_rag_service(app):
     try:
         chain, components = build_streaming_chain()
         qdrant_client, embedding_model, bm25_index, bm25_metadata = components
-        collection_name = os.getenv("COLLECTION_NAME", "naga_full")
+        collection_name = get_env("COLLECTION_NAME", "naga_full")
         
         rag_service_instance = RAGService(chain, qdrant_client, embedding_model, collection_name, bm25_index, bm25_metadata)
         
         rag_chain = rag_service_instance  # Store the instance
         retriever_components = components
         
-        print("✅ RAG service initialized successfully")
+        logger.info("RAG service initialized successfully")
         return rag_service_instance
     except Exception as e:
-        print(f"❌ Failed to initialize RAG service: {e}")
+        logger.error("Failed to initialize RAG service: %s", e)
         raise
\ No newline at end of file
@@ -1,13 +1,245 @@
-from flask import Blueprint, render_template, request, jsonify, Response, current_app, redirect, url_for, session
+from flask import Blueprint, render_template, request, jsonify, Response, current_app, g, redirect, url_for, session, stream_with_context
+import atexit
+import hashlib
 import json
+import logging
+import queue
 import time
 import traceback
 import threading
+import uuid
+from collections import defaultdict
 from functools import wraps
 from datetime import datetime, timedelta
 
+# auth_service only pulls in the supabase client, so importing it here is
+# cheap and saves every view the per-request import-lock round. rag_service
+# and analytics_service stay function-level imports on purpose: they drag in
+# torch / sklearn and the app factory must be importable without them.
+from .auth_service import auth_service
+
+try:
+    import orjson
+
+    def _json_line(obj):
+        """Serialize one newline-delimited JSON frame for the token stream"""
+        return orjson.dumps(obj) + b'\n'
+except ImportError:  # orjson is in requirements, but don't hard-require it
+    orjson = None
+
+    def _json_line(obj):
+        """Serialize one newline-delimited JSON frame for the token stream"""
+        return (json.dumps(obj) + '\n').encode()
+
 bp = Blueprint('main', __name__)
 
+# Analytics is a module-level singleton, but importing get_analytics_service
+# inside every handler still pays a sys.modules lookup and import-lock
+# acquisition per request. Resolve it once and hand out the cached reference;
+# the import stays lazy so the app factory remains importable without
+# sklearn/torch (minimal init).
+_analytics_service = None
+
+
+def _get_analytics_service():
+    global _analytics_service
+    if _analytics_service is None:
+        from .analytics_service import get_analytics_service as _factory
+        _analytics_service = _factory()
+    return _analytics_service
+
+
+# Per-request diagnostics go to DEBUG with lazy %s formatting: arguments are
+# only stringified when the level is enabled, and nothing contends on the
+# stdout pipe per token under gunicorn. Errors stay at WARNING/ERROR.
+logger = logging.getLogger(__name__)
+
+# Background database writer. Each chat turn used to spawn a fresh thread
+# that issued three sequential Supabase inserts; instead, request handlers
+# enqueue (table, rows) tuples and a single long-lived thread coalesces
+# everything queued within a short window into one bulk insert per table.
+_WRITE_QUEUE = queue.Queue()
+_WRITE_FLUSH_WINDOW = 0.2  # seconds to let a burst accumulate
+
+def _drain_write_queue():
+    while True:
+        batches = {}
+        table, rows = _WRITE_QUEUE.get()
+        batches.setdefault(table, []).extend(rows)
+
+        # Group whatever else arrives within the flush window by table
+        deadline = time.monotonic() + _WRITE_FLUSH_WINDOW
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                table, rows = _WRITE_QUEUE.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batches.setdefault(table, []).extend(rows)
+
+        # Backfill keywords for the whole analytics batch in one vectorizer
+        # pass; doing this per request serialized TF-IDF work on the hot path
+        analytics_rows = batches.get('query_analytics')
+        if analytics_rows:
+            try:
+                per_row = _get_analytics_service().extract_keywords_batch(
+                    [r.get('query_text', '') for r in analytics_rows], top_n=10
+                )
+                for row, keywords in zip(analytics_rows, per_row):
+                    row['keywords'] = keywords
+            except Exception as e:
+                logger.warning("Batch keyword extraction failed: %s", e)
+
+        for table, rows in batches.items():
+            try:
+                auth_service.admin_supabase.table(table).insert(rows).execute()
+                logger.debug("Background writer flushed %d row(s) to %s", len(rows), table)
+            except Exception as e:
+                logger.warning("Background write to %s failed: %s", table, e)
+
+        # save_chat_message used to bump the session timestamp and drop the
+        # history cache on every save; do the same once per flushed session
+        chat_sessions = {r['chat_session_id'] for r in batches.get('chat_messages', [])}
+        for chat_session_id in chat_sessions:
+            try:
+                auth_service.admin_supabase.table('chat_sessions')\
+                    .update({'updated_at': datetime.utcnow().isoformat()})\
+                    .eq('id', chat_session_id)\
+                    .execute()
+            except Exception as e:
+                logger.warning("Failed to touch chat session %s: %s", chat_session_id, e)
+            auth_service._invalidate_history_cache(chat_session_id)
+
+_writer_thread = threading.Thread(target=_drain_write_queue, name='db-writer', daemon=True)
+_writer_thread.start()
+
+def _flush_write_queue_at_exit():
+    """Flush whatever is still queued before the process exits
+
+    The writer is a daemon thread, so a rolling deploy could otherwise drop
+    the rows enqueued by the last few requests.
+    """
+    batches = {}
+    while True:
+        try:
+            table, rows = _WRITE_QUEUE.get_nowait()
+        except queue.Empty:
+            break
+        batches.setdefault(table, []).extend(rows)
+    for table, rows in batches.items():
+        try:
+            auth_service.admin_supabase.table(table).insert(rows).execute()
+        except Exception as e:
+            logger.warning("Final flush to %s failed: %s", table, e)
+
+atexit.register(_flush_write_queue_at_exit)
+
+# 90-day retention timestamp for analytics/error rows, refreshed at most
+# once a minute - building datetime + timedelta + isoformat per insert is
+# pointless precision for a 90-day TTL
+_EXPIRES_90D = ('', 0.0)
+
+def _expires_at_90d():
+    global _EXPIRES_90D
+    value, at = _EXPIRES_90D
+    now = time.monotonic()
+    if not value or now - at >= 60:
+        value = (datetime.utcnow() + timedelta(days=90)).isoformat()
+        _EXPIRES_90D = (value, now)
+    return value
+
+# Double-click guard: a rapid duplicate first message would create two empty
+# chat sessions. Keyed by (user_id, message digest); entries expire after a
+# few seconds so a genuinely repeated message later starts a fresh session.
+_SESSION_DEDUP = {}
+_SESSION_DEDUP_TTL = 5  # seconds
+_SESSION_DEDUP_SIZE = 8192
+# One lock per dedup key: the critical section spans the create_chat_session
+# round trip, so a single global lock would serialize every concurrent
+# new-chat creation in the process behind one network call. Per-key locks
+# make only a true duplicate of the same first message wait on its twin.
+_SESSION_DEDUP_LOCKS = defaultdict(threading.Lock)
+
+# Formatted chat history, keyed by (chat_id, last_message_id). The formatted
+# string for a given message tail never changes, so plain LRU eviction is
+# enough - no TTL or explicit invalidation needed.
+_HISTORY_FMT_CACHE = {}
+_HISTORY_FMT_CACHE_SIZE = 4096
+_HISTORY_FMT_LOCK = threading.Lock()
+
+def _format_chat_history_cached(chat_id, messages, max_exchanges=5):
+    from .rag_service import format_chat_history
+
+    key = (chat_id, messages[-1].get('id') if messages else None)
+    with _HISTORY_FMT_LOCK:
+        formatted = _HISTORY_FMT_CACHE.get(key)
+    if formatted is None:
+        formatted = format_chat_history(messages, max_exchanges=max_exchanges)
+        with _HISTORY_FMT_LOCK:
+            if len(_HISTORY_FMT_CACHE) >= _HISTORY_FMT_CACHE_SIZE:
+                _HISTORY_FMT_CACHE.clear()
+            _HISTORY_FMT_CACHE[key] = formatted
+    return formatted
+
+@bp.before_request
+def load_session_user():
+    """Cache the session user on flask.g once per request
+
+    The signed-cookie session is HMAC-verified and deserialized on first
+    access, and the decorators plus most views each walk session['user']
+    again. Reading it once here makes downstream checks plain attribute
+    reads (g.user_id / g.user_role).
+    """
+    g.user = session.get('user')
+    g.user_id = g.user.get('id') if g.user else None
+    g.user_role = (g.user or {}).get('role', 'user')
+    # Top-level claim set at sign-in; fall back to the role walk for
+    # sessions issued before the claim existed
+    g.is_admin = session.get('is_admin', g.user_role == 'admin')
+
+# Rendered bodies of fully static pages, keyed by endpoint
+_STATIC_PAGE_CACHE = {}
+
+def cache_static(seconds=3600, memoize=False):
+    """Serve a static page with a strong ETag and public Cache-Control
+
+    Lets proxies/CDNs answer repeat hits and browsers revalidate with 304s
+    instead of re-downloading the page. With memoize=True the rendered body
+    itself is kept in memory, skipping the Jinja render too - only safe for
+    views with no per-request logic. Vary is limited to Accept-Language;
+    these views never touch the session, so no cookie leaks into the cache.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            cached = _STATIC_PAGE_CACHE.get(request.endpoint) if memoize else None
+            if cached is None:
+                rv = f(*args, **kwargs)
+                if not isinstance(rv, str):
+                    return rv  # redirects and error tuples pass through
+                etag = hashlib.blake2b(rv.encode(), digest_size=16).hexdigest()
+                cached = (rv, etag)
+                if memoize:
+                    _STATIC_PAGE_CACHE[request.endpoint] = cached
+            body, etag = cached
+            resp = Response(body, mimetype='text/html')
+            resp.set_etag(etag)
+            resp.cache_control.public = True
+            resp.cache_control.max_age = seconds
+            resp.vary.add('Accept-Language')
+            return resp.make_conditional(request)
+        return wrapped
+    return decorator
+
+def _services_settled(init_state):
+    """True once every service init has settled (complete, disabled, or failed)"""
+    services = init_state.get('services', {}).values()
+    return bool(services) and all(
+        s.get('status') in ('complete', 'disabled', 'failed') for s in services
+    )
+
 # Health check endpoint for monitoring (no authentication required)
 @bp.route('/health')
 def health():
@@ -15,14 +247,14 @@ def health():
     try:
         rag_service = current_app.config.get('RAG_SERVICE')
         analytics_service = current_app.config.get('ANALYTICS_SERVICE')
-        services_initialized = current_app.config.get('SERVICES_INITIALIZED', False)
         init_state = current_app.config.get('INIT_STATE', {})
         
-        # Check if services are initialized
+        # Check if services are initialized - readiness is computed from the
+        # actual per-service init state, not a flag set before init finishes
         services_status = {
             'rag_service': rag_service is not None,
             'analytics_service': analytics_service is not None,
-            'services_initialized': services_initialized
+            'services_initialized': _services_settled(init_state)
         }
         
         # Determine overall health
@@ -63,7 +295,7 @@ def health():
     except Exception as e:
         # Even if there's an error in the health check itself, return 200
         # so we don't cause cascading failures in Azure monitoring
-        print(f"⚠️  Error in health check: {str(e)}")
+        logger.warning("Error in health check: %s", e)
         return jsonify({
             'status': 'error',
             'timestamp': datetime.utcnow().isoformat() + 'Z',
@@ -71,6 +303,34 @@ def health():
             'error': 'Health check encountered an error but app is running'
         }), 200
 
+@bp.route('/health/live')
+def health_live():
+    """Liveness probe - returns 200 whenever the app is able to serve requests"""
+    return jsonify({
+        'status': 'alive',
+        'timestamp': datetime.utcnow().isoformat() + 'Z'
+    }), 200
+
+@bp.route('/health/ready')
+def health_ready():
+    """Readiness probe - returns 503 until background service init completes"""
+    init_state = current_app.config.get('INIT_STATE', {})
+    overall_status = init_state.get('status', 'unknown')
+
+    services = {
+        name: info.get('status', 'unknown')
+        for name, info in init_state.get('services', {}).items()
+    }
+
+    rag_status = init_state.get('services', {}).get('rag', {}).get('status', 'unknown')
+    ready = _services_settled(init_state) and rag_status in ('complete', 'disabled')
+    return jsonify({
+        'status': 'ready' if ready else 'initializing',
+        'init_status': overall_status,
+        'services': services,
+        'timestamp': datetime.utcnow().isoformat() + 'Z'
+    }), 200 if ready else 503
+
 # Debug endpoint for startup diagnostics (no authentication required)
 @bp.route('/startup-status')
 def startup_status():
@@ -82,7 +342,7 @@ def startup_status():
         response = {
             'timestamp': datetime.utcnow().isoformat() + 'Z',
             'overall_status': init_state.get('status', 'unknown'),
-            'services_initialized': current_app.config.get('SERVICES_INITIALIZED', False),
+            'services_initialized': _services_settled(init_state),
             'services': {}
         }
         
@@ -122,7 +382,7 @@ def startup_status():
         return jsonify(response), 200
         
     except Exception as e:
-        print(f"⚠️  Error in startup-status endpoint: {str(e)}")
+        logger.warning("Error in startup-status endpoint: %s", e)
         return jsonify({
             'error': 'Failed to retrieve startup status',
             'error_details': str(e),
@@ -133,7 +393,7 @@ def login_required(f):
     """Decorator to require login for routes"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user' not in session:
+        if g.user is None:
             return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
@@ -142,31 +402,32 @@ def admin_required(f):
     """Decorator to require admin role for routes"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user' not in session:
+        if g.user is None:
             return jsonify({'error': 'Authentication required'}), 401
-        
-        user_role = session.get('user', {}).get('role', 'user')
-        if user_role != 'admin':
+
+        if not g.is_admin:
             return jsonify({'error': 'Admin access required'}), 403
-        
+
         return f(*args, **kwargs)
     return decorated_function
 
 @bp.route('/')
 def index():
-    if 'user' not in session:
+    if g.user is None:
         return redirect(url_for('main.login'))
     return render_template('chat.html')
 
 @bp.route('/login')
+@cache_static()
 def login():
-    if 'user' in session:
+    if g.user is not None:
         return redirect(url_for('main.chat'))
     return render_template('login.html')
 
 @bp.route('/signup')
+@cache_static()
 def signup():
-    if 'user' in session:
+    if g.user is not None:
         return redirect(url_for('main.chat'))
     return render_template('signup.html')
 
@@ -176,16 +437,19 @@ def chat():
     return render_template('chat.html')
 
 @bp.route('/about')
+@cache_static(memoize=True)
 def about():
     """About page"""
     return render_template('about.html')
 
 @bp.route('/charter')
+@cache_static(memoize=True)
 def charter():
     """Charter page"""
     return render_template('charter.html')
 
 @bp.route('/pricing')
+@cache_static(memoize=True)
 def pricing():
     """Pricing page"""
     return render_template('pricing.html')
@@ -194,7 +458,6 @@ def pricing():
 @bp.route('/api/auth/signup', methods=['POST'])
 def api_signup():
     """Handle email signup"""
-    from .auth_service import auth_service
     
     data = request.get_json()
     email = data.get('email', '').strip()
@@ -213,7 +476,6 @@ def api_signup():
 @bp.route('/api/auth/signin', methods=['POST'])
 def api_signin():
     """Handle email signin"""
-    from .auth_service import auth_service
     
     data = request.get_json()
     email = data.get('email', '').strip()
@@ -226,6 +488,7 @@ def api_signin():
     
     if status_code == 200:
         session['user'] = result['user']
+        session['is_admin'] = result['user'].get('role') == 'admin'
         session['access_token'] = result['session']['access_token']
     
     return jsonify(result), status_code
@@ -233,7 +496,6 @@ def api_signin():
 @bp.route('/api/auth/google')
 def api_google_auth():
     """Get Google OAuth URL"""
-    from .auth_service import auth_service
     
     result, status_code = auth_service.sign_in_with_google()
     return jsonify(result), status_code
@@ -241,7 +503,6 @@ def api_google_auth():
 @bp.route('/auth/callback')
 def auth_callback():
     """Handle OAuth callback - both hash fragment and query params"""
-    from .auth_service import auth_service
     
     # Check for authorization code in query params (OAuth flow)
     code = request.args.get('code')
@@ -252,6 +513,7 @@ def auth_callback():
         
         if status_code == 200:
             session['user'] = result['user']
+            session['is_admin'] = result['user'].get('role') == 'admin'
             session['access_token'] = result['session']['access_token']
             return redirect(url_for('main.chat'))
         else:
@@ -263,7 +525,6 @@ def auth_callback():
 @bp.route('/api/auth/callback/session', methods=['POST'])
 def api_callback_session():
     """Handle session creation from OAuth callback"""
-    from .auth_service import auth_service
     
     data = request.get_json()
     access_token = data.get('access_token')
@@ -276,6 +537,7 @@ def api_callback_session():
     
     if status_code == 200:
         session['user'] = result['user']
+        session['is_admin'] = result['user'].get('role') == 'admin'
         session['access_token'] = access_token
         return jsonify({'success': True, 'redirect': '/chat'}), 200
     
@@ -284,7 +546,6 @@ def api_callback_session():
 @bp.route('/api/auth/signout', methods=['POST'])
 def api_signout():
     """Handle signout"""
-    from .auth_service import auth_service
     
     session.clear()
     result, status_code = auth_service.sign_out()
@@ -293,8 +554,8 @@ def api_signout():
 @bp.route('/api/auth/user', methods=['GET'])
 def api_get_user():
     """Get current user"""
-    if 'user' in session:
-        return jsonify({'user': session['user']}), 200
+    if g.user is not None:
+        return jsonify({'user': g.user}), 200
     return jsonify({'error': 'Not authenticated'}), 401
 
 # Chat API Routes - WITH CONVERSATION MEMORY
@@ -303,12 +564,10 @@ def api_get_user():
 def chat_api():
     """Handle chat messages with conversation memory and streaming"""
     from .rag_service import is_allowed, format_chat_history, get_rag_service
-    from .auth_service import auth_service
-    from .analytics_service import get_analytics_service
     from datetime import datetime, timedelta
     
     # Analytics tracking variables
-    request_start_time = time.time()
+    request_start_time = time.monotonic()
     analytics_data = {
         'user_id': None,
         'chat_session_id': None,
@@ -326,15 +585,19 @@ def chat_api():
         user_message = data.get('message', '')
         chat_id = data.get('chat_id', None)
         
+        # Reject empty messages before touching any service
+        if not user_message or not user_message.strip():
+            return jsonify({'error': 'Message is required'}), 400
+
         # Store for analytics
         analytics_data['query_text'] = user_message
-        
-        print(f"📨 Received message: {user_message[:100]}...")
-        
+
+        logger.debug("Received message: %s...", user_message[:100])
+
         if not is_allowed(user_message):
             return jsonify({'error': 'Sorry, I can\'t assist with that.'}), 400
-        
-        user_id = session.get('user', {}).get('id')
+
+        user_id = g.user_id
         if not user_id:
             return jsonify({'error': 'User not authenticated'}), 401
         
@@ -344,80 +607,94 @@ def chat_api():
         # Create new chat session if needed
         if not chat_id:
             title = user_message[:50] + ('...' if len(user_message) > 50 else '')
-            chat_session, status = auth_service.create_chat_session(user_id, title)
-            
-            if status != 200:
-                print(f"❌ Failed to create chat session: {chat_session}")
-                return jsonify({'error': 'Failed to create chat session'}), 500
+            dedup_key = (user_id, hashlib.blake2b(user_message.encode(), digest_size=8).digest())
             
-            chat_id = chat_session['id']
-            print(f"✅ Created new chat session: {chat_id}")
+            # The per-key lock also covers the insert so a concurrent
+            # duplicate waits and reuses the session instead of racing to
+            # create its own; unrelated new chats don't contend
+            with _SESSION_DEDUP_LOCKS[dedup_key]:
+                now = time.monotonic()
+                cached = _SESSION_DEDUP.get(dedup_key)
+                if cached and now - cached[1] < _SESSION_DEDUP_TTL:
+                    chat_id = cached[0]
+                    logger.debug("Reusing just-created chat session: %s", chat_id)
+                else:
+                    chat_session, status = auth_service.create_chat_session(user_id, title)
+
+                    if status != 200:
+                        logger.error("Failed to create chat session: %s", chat_session)
+                        return jsonify({'error': 'Failed to create chat session'}), 500
+
+                    chat_id = chat_session['id']
+                    if len(_SESSION_DEDUP) >= _SESSION_DEDUP_SIZE:
+                        _SESSION_DEDUP.clear()
+                        _SESSION_DEDUP_LOCKS.clear()
+                    _SESSION_DEDUP[dedup_key] = (chat_id, now)
+                    logger.debug("Created new chat session: %s", chat_id)
         
         # Store for analytics
         analytics_data['chat_session_id'] = chat_id
         
-        # Fetch conversation history from database
-        messages, status = auth_service.get_chat_messages(chat_id)
+        # Fetch conversation history (short TTL cache, invalidated on save).
+        # Only the last 10 messages are needed for 5 exchanges of context.
+        messages, status = auth_service.get_chat_messages_cached(chat_id, limit=10)
         
         chat_history = ""
         if status == 200 and messages:
             # Format last 5 exchanges for context (limit to prevent token overflow)
-            chat_history = format_chat_history(messages, max_exchanges=5)
-            print(f"📚 Loaded {len(messages)} total messages, using last {min(10, len(messages))} for context")
+            chat_history = _format_chat_history_cached(chat_id, messages, max_exchanges=5)
+            logger.debug("Loaded %d messages for context", len(messages))
         else:
-            print(f"📚 No previous conversation history")
+            logger.debug("No previous conversation history")
         
         # Get RAG service
         try:
             rag_service = get_rag_service()
         except RuntimeError:
-            print("⚠️  RAG service not available, using fallback")
+            logger.warning("RAG service not available, using fallback")
             def generate_fallback():
-                yield json.dumps({'chat_id': chat_id}) + '\n'
+                # No artificial typewriter pacing: sleeping per character held
+                # a worker thread for seconds per failing request. Any typing
+                # effect belongs client-side.
+                yield _json_line({'chat_id': chat_id})
                 response = "I apologize, but the AI system is currently unavailable. Please try again later."
-                for char in response:
-                    yield json.dumps({'token': char}) + '\n'
-                    time.sleep(0.03)
-                yield json.dumps({'done': True, 'error': 'system_unavailable'}) + '\n'
+                yield _json_line({'token': response})
+                yield _json_line({'done': True, 'error': 'system_unavailable'})
             
             return Response(generate_fallback(), mimetype='application/json')
         
         bot_response = ""
         stream_error = None
+        # Pre-generate the bot message id so the done frame can carry it and
+        # feedback submissions can reference it without a lookup query
+        bot_msg_id = str(uuid.uuid4())
         
-        def save_messages_and_analytics_async():
-            """Save messages and analytics to database in background thread AFTER streaming completes"""
+        def queue_messages_and_analytics():
+            """Queue messages and analytics for the background writer AFTER streaming completes"""
             try:
-                print(f"💾 Saving messages to database in background...")
-                
-                # Save user message
-                msg_result, msg_status = auth_service.save_chat_message(chat_id, 'user', user_message)
-                if msg_status == 200:
-                    print(f"✅ User message saved")
-                else:
-                    print(f"⚠️  Failed to save user message: {msg_result}")
-                
-                # Save bot response (even if partial due to error)
+                message_rows = [{
+                    'chat_session_id': chat_id,
+                    'role': 'user',
+                    'content': user_message
+                }]
+                # Queue bot response (even if partial due to error)
                 if bot_response:
-                    msg_result, msg_status = auth_service.save_chat_message(chat_id, 'bot', bot_response)
-                    if msg_status == 200:
-                        print(f"✅ Bot response saved ({len(bot_response)} chars)")
-                    else:
-                        print(f"⚠️  Failed to save bot response: {msg_result}")
-                
-                # Save analytics data
+                    message_rows.append({
+                        'id': bot_msg_id,
+                        'chat_session_id': chat_id,
+                        'role': 'bot',
+                        'content': bot_response
+                    })
+                _WRITE_QUEUE.put(('chat_messages', message_rows))
+
+                # Queue analytics data; keywords are backfilled by the
+                # background writer in one batched TF-IDF pass
                 try:
-                    analytics_service = get_analytics_service()
-                    
                     # Calculate response time
-                    response_time_ms = int((time.time() - request_start_time) * 1000)
+                    response_time_ms = int((time.monotonic() - request_start_time) * 1000)
                     analytics_data['response_time_ms'] = response_time_ms
                     analytics_data['tokens_used'] = len(bot_response)  # Approximate
-                    
-                    # Extract keywords
-                    keywords = analytics_service.extract_keywords_tfidf(user_message, top_n=10)
-                    analytics_data['keywords'] = keywords
-                    
+
                     # Prepare analytics record
                     analytics_record = {
                         'user_id': analytics_data['user_id'],
@@ -429,36 +706,44 @@ def chat_api():
                         'search_method': analytics_data['search_method'],
                         'hybrid_score': analytics_data['hybrid_score'],
                         'tokens_used': analytics_data['tokens_used'],
-                        'expires_at': (datetime.utcnow() + timedelta(days=90)).isoformat()
+                        'expires_at': _expires_at_90d()
                     }
-                    
-                    # Insert to database
-                    auth_service.admin_supabase.table('query_analytics').insert(analytics_record).execute()
-                    print(f"✅ Analytics saved: {response_time_ms}ms, {analytics_data['documents_retrieved']} docs")
-                    
+
+                    _WRITE_QUEUE.put(('query_analytics', [analytics_record]))
+
                 except Exception as analytics_error:
-                    print(f"⚠️  Failed to save analytics: {str(analytics_error)}")
-                        
+                    logger.warning("Failed to queue analytics: %s", analytics_error)
+
             except Exception as e:
-                print(f"❌ Error saving messages in background: {str(e)}")
-                print(f"📋 Traceback: {traceback.format_exc()}")
+                logger.exception("Error queueing messages for save")
         
         def generate():
             nonlocal bot_response, stream_error
+            # Accumulate chunks in a list and join once at the end: repeated
+            # str += on a closure variable reallocates the growing string on
+            # every token, which is quadratic for long responses
+            bot_chunks = []
+            bot_len = 0
+            # Small coalescing buffer for the wire: one frame per token means
+            # one socket write (and TLS record) per token. Batching up to 8
+            # tokens or 20ms keeps perceived latency while cutting the
+            # per-frame overhead ~8x.
+            token_buf = []
+            buf_deadline = 0.0
             try:
-                print(f"🔄 Starting streaming with hybrid search...")
+                logger.debug("Starting streaming with hybrid search...")
                 chunk_count = 0
-                start_time = time.time()
+                start_time = time.monotonic()
                 max_chunks = 10000  # Safety limit to prevent infinite loops
                 last_chunk_time = start_time
                 
                 # Send chat_id FIRST - immediate flush
-                yield json.dumps({'chat_id': chat_id}) + '\n'
+                yield _json_line({'chat_id': chat_id})
                 
                 # Perform hybrid search to get context
-                print(f"🔍 Performing hybrid search...")
+                logger.debug("Performing hybrid search...")
                 context = rag_service.hybrid_search(user_message)
-                print(f"📄 Retrieved {len(context)} documents from hybrid search")
+                logger.debug("Retrieved %d documents from hybrid search", len(context))
                 
                 # Track analytics data
                 analytics_data['documents_retrieved'] = len(context)
@@ -471,70 +756,93 @@ def chat_api():
                 # Stream the response with monitoring
                 for chunk in rag_service.generate_response_streaming(user_message, context, chat_history):
                     if chunk:
-                        bot_response += chunk
+                        bot_chunks.append(chunk)
+                        bot_len += len(chunk)
                         chunk_count += 1
-                        current_time = time.time()
+                        current_time = time.monotonic()
                         
                         # Safety check for max chunks
                         if chunk_count > max_chunks:
-                            print(f"⚠️  Hit max chunk limit ({max_chunks}) - stopping stream")
+                            logger.warning("Hit max chunk limit (%d) - stopping stream", max_chunks)
                             stream_error = "response_too_long"
                             break
                         
                         # Timeout check (if no chunks for 30 seconds)
                         if current_time - last_chunk_time > 30:
-                            print(f"⚠️  Stream timeout - no chunks for 30s")
+                            logger.warning("Stream timeout - no chunks for 30s")
                             stream_error = "stream_timeout"
                             break
                         
                         last_chunk_time = current_time
                         
-                        # Yield each token immediately - no buffering
-                        yield json.dumps({'token': chunk}) + '\n'
+                        token_buf.append(chunk)
+                        if len(token_buf) == 1:
+                            buf_deadline = current_time + 0.02
+                        if len(token_buf) >= 8 or current_time >= buf_deadline:
+                            yield _json_line({'tokens': token_buf})
+                            token_buf = []
                         
                         # Log progress every 100 chunks
-                        if chunk_count % 100 == 0:
+                        if chunk_count % 100 == 0 and logger.isEnabledFor(logging.DEBUG):
                             elapsed = current_time - start_time
-                            print(f"📊 Progress: {chunk_count} chunks, {len(bot_response)} chars, {elapsed:.1f}s")
+                            logger.debug("Progress: %d chunks, %d chars, %.1fs", chunk_count, bot_len, elapsed)
                 
-                elapsed_time = time.time() - start_time
-                print(f"✅ Stream completed: {chunk_count} chunks, {len(bot_response)} chars in {elapsed_time:.2f}s")
+                if token_buf:
+                    yield _json_line({'tokens': token_buf})
+                    token_buf = []
+                
+                bot_response = ''.join(bot_chunks)
+                elapsed_time = time.monotonic() - start_time
+                logger.info("Stream completed: %d chunks, %d chars in %.2fs", chunk_count, bot_len, elapsed_time)
                 
                 # Send completion signal with metadata
                 completion_data = {
                     'done': True,
+                    'message_id': bot_msg_id,
                     'chunks': chunk_count,
-                    'chars': len(bot_response),
+                    'chars': bot_len,
                     'time': round(elapsed_time, 2)
                 }
                 
                 if stream_error:
                     completion_data['warning'] = stream_error
-                    print(f"⚠️  Stream completed with warning: {stream_error}")
+                    logger.warning("Stream completed with warning: %s", stream_error)
                 
-                yield json.dumps(completion_data) + '\n'
+                yield _json_line(completion_data)
                 
-                # Save to database AFTER streaming completes (in background thread)
-                threading.Thread(target=save_messages_and_analytics_async, daemon=True).start()
+                # Save to database AFTER streaming completes (via background writer)
+                queue_messages_and_analytics()
                 
             except Exception as e:
                 # Better error handling with actual error message
                 error_type = type(e).__name__
                 error_msg = str(e)
-                print(f"❌ Error in RAG service ({error_type}): {error_msg}")
-                print(f"📋 Traceback: {traceback.format_exc()}")
+                # Walk the stack once and reuse the string; format_exc is
+                # pure-Python frame walking that adds up under error storms
+                tb = traceback.format_exc()
+                logger.error("Error in RAG service (%s): %s\n%s", error_type, error_msg, tb[:500])
+                
+                # Flush any tokens still buffered so the client shows
+                # everything that was generated before the failure
+                if token_buf:
+                    yield _json_line({'tokens': token_buf})
+                    token_buf = []
                 
                 # If we have partial response, send it
-                if bot_response:
-                    print(f"⚠️  Sending partial response ({len(bot_response)} chars)")
+                bot_response = ''.join(bot_chunks)
+                if bot_len:
+                    logger.warning("Sending partial response (%d chars)", bot_len)
                 
                 # Send error with details
                 error_data = {
                     'error': 'An error occurred while generating the response.',
                     'error_type': error_type,
                     'done': True,
-                    'partial': len(bot_response) > 0
+                    'partial': bot_len > 0
                 }
+                if bot_len:
+                    # Partial responses are still saved under this id
+                    error_data['message_id'] = bot_msg_id
                 
                 # Don't expose internal errors to user, but log them
                 if 'timeout' in error_msg.lower():
@@ -544,11 +852,11 @@ def chat_api():
                 else:
                     error_data['user_message'] = 'An unexpected error occurred. Please try again.'
                 
-                yield json.dumps(error_data) + '\n'
+                yield _json_line(error_data)
                 
                 # Still save partial response if available
-                if bot_response:
-                    threading.Thread(target=save_messages_and_analytics_async, daemon=True).start()
+                if bot_len:
+                    queue_messages_and_analytics()
                 
                 # Log error to error_logs table
                 try:
@@ -556,29 +864,27 @@ def chat_api():
                         'user_id': analytics_data['user_id'],
                         'error_type': error_type,
                         'error_message': error_msg[:500],  # Limit length
-                        'stack_trace': traceback.format_exc()[:2000],  # Limit length
+                        'stack_trace': tb[:2000],  # Limit length
                         'endpoint': '/api/chat',
                         'request_data': json.dumps({'message': user_message[:200]}),
-                        'expires_at': (datetime.utcnow() + timedelta(days=90)).isoformat()
+                        'expires_at': _expires_at_90d()
                     }
                     auth_service.admin_supabase.table('error_logs').insert(error_record).execute()
                 except Exception as log_error:
-                    print(f"⚠️  Failed to log error: {str(log_error)}")
+                    logger.warning("Failed to log error: %s", log_error)
         
         return Response(generate(), mimetype='application/json')
         
     except Exception as e:
-        print(f"❌ Error in chat_api: {str(e)}")
-        print(f"📋 Traceback: {traceback.format_exc()}")
+        logger.exception("Error in chat_api")
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
 @bp.route('/api/chat/history', methods=['GET'])
 @login_required
 def get_chat_history():
     """Return chat history for student"""
-    from .auth_service import auth_service
-    
-    user_id = session.get('user', {}).get('id')
+
+    user_id = g.user_id
     if not user_id:
         return jsonify({'error': 'User not authenticated'}), 401
     
@@ -593,7 +899,6 @@ def get_chat_history():
 @login_required
 def get_chat(chat_id):
     """Get specific chat conversation"""
-    from .auth_service import auth_service
     
     messages, status = auth_service.get_chat_messages(chat_id)
     
@@ -606,7 +911,6 @@ def get_chat(chat_id):
 @login_required
 def delete_chat(chat_id):
     """Delete a chat session"""
-    from .auth_service import auth_service
     
     result, status = auth_service.delete_chat_session(chat_id)
     return jsonify(result), status
@@ -615,7 +919,6 @@ def delete_chat(chat_id):
 @login_required
 def update_chat_title(chat_id):
     """Update chat session title"""
-    from .auth_service import auth_service
     
     data = request.get_json()
     title = data.get('title', '')
@@ -634,7 +937,10 @@ def search_documents():
     
     data = request.get_json()
     query = data.get('query', '')
-    
+
+    if not query or not query.strip():
+        return jsonify({'error': 'Query is required'}), 400
+
     if not is_allowed(query):
         return jsonify({'error': 'Sorry, I can\'t assist with that.'}), 400
     
@@ -659,7 +965,7 @@ def search_documents():
         return jsonify({'results': formatted_results})
     
     except Exception as e:
-        print(f"❌ Search error: {e}")
+        logger.error("Search error: %s", e)
         return jsonify({'error': 'Search failed'}), 500
 
 # ============================================
@@ -670,8 +976,7 @@ def search_documents():
 @login_required
 def admin_dashboard():
     """Admin dashboard page"""
-    user_role = session.get('user', {}).get('role', 'user')
-    if user_role != 'admin':
+    if not g.is_admin:
         return redirect(url_for('main.chat'))
     return render_template('admin.html')
 
@@ -679,12 +984,10 @@ def admin_dashboard():
 @login_required
 def submit_feedback():
     """Submit user feedback on a bot response"""
-    from .auth_service import auth_service
     
     try:
         data = request.get_json()
-        chat_session_id = data.get('chat_session_id')
-        chat_message_id = data.get('chat_message_id')  # Optional - for legacy support
+        chat_message_id = data.get('chat_message_id')
         rating = data.get('rating')  # 1-5
         feedback_text = data.get('feedback_text', '')
         
@@ -693,28 +996,15 @@ def submit_feedback():
         
         if not isinstance(rating, int) or rating < 1 or rating > 5:
             return jsonify({'error': 'Rating must be between 1 and 5'}), 400
-        
-        user_id = session.get('user', {}).get('id')
+
+        user_id = g.user_id
         if not user_id:
             return jsonify({'error': 'User not authenticated'}), 401
         
-        # If chat_message_id not provided, find the most recent bot message in the session
-        if not chat_message_id and chat_session_id:
-            messages_response = auth_service.admin_supabase.table('chat_messages')\
-                .select('id')\
-                .eq('chat_session_id', chat_session_id)\
-                .eq('role', 'bot')\
-                .order('created_at', desc=True)\
-                .limit(1)\
-                .execute()
-            
-            if messages_response.data and len(messages_response.data) > 0:
-                chat_message_id = messages_response.data[0]['id']
-            else:
-                return jsonify({'error': 'No bot message found in this session'}), 404
-        
+        # The streamed done frame carries message_id, so the client can always
+        # echo the exact bot message back - no latest-bot-message lookup needed
         if not chat_message_id:
-            return jsonify({'error': 'Could not identify message for feedback'}), 400
+            return jsonify({'error': 'chat_message_id is required'}), 400
         
         # Insert feedback
         feedback_record = {
@@ -729,8 +1019,7 @@ def submit_feedback():
         return jsonify({'message': 'Feedback submitted successfully'}), 200
         
     except Exception as e:
-        print(f"❌ Feedback submission error: {str(e)}")
-        print(f"📋 Traceback: {traceback.format_exc()}")
+        logger.exception("Feedback submission error")
         return jsonify({'error': 'Failed to submit feedback'}), 500
 
 # ============================================
@@ -740,9 +1029,7 @@ def submit_feedback():
 def log_admin_action(action_type: str, resource: str, filters: dict = None):
     """Helper function to log admin actions"""
     try:
-        from .auth_service import auth_service
-        
-        admin_id = session.get('user', {}).get('id')
+        admin_id = g.user_id
         if not admin_id:
             return
         
@@ -755,51 +1042,131 @@ def log_admin_action(action_type: str, resource: str, filters: dict = None):
             'user_agent': request.headers.get('User-Agent', '')[:500]
         }
         
-        auth_service.admin_supabase.table('admin_audit_log').insert(audit_record).execute()
-        
+        # Audit writes are off the critical path: hand the row to the
+        # background writer so admin endpoints don't pay an insert round trip
+        # before responding. Bursts coalesce into one bulk insert per flush.
+        _WRITE_QUEUE.put(('admin_audit_log', [audit_record]))
+
     except Exception as e:
-        print(f"⚠️  Failed to log admin action: {str(e)}")
+        logger.warning("Failed to log admin action: %s", e)
+
+# Dashboard overview memo: the payload only counts aggregates, so every admin
+# polling the dashboard within the TTL shares one computation.
+_OVERVIEW_CACHE = (None, 0.0)
+_OVERVIEW_CACHE_TTL = 30
+_OVERVIEW_LOCK = threading.Lock()
+
+
+def _invalidate_overview_cache():
+    global _OVERVIEW_CACHE
+    with _OVERVIEW_LOCK:
+        _OVERVIEW_CACHE = (None, 0.0)
+
 
 @bp.route('/api/admin/analytics/overview', methods=['GET'])
 @admin_required
 def admin_analytics_overview():
     """Get dashboard overview statistics"""
-    from .auth_service import auth_service
-    from .analytics_service import get_analytics_service
-    
+    global _OVERVIEW_CACHE
+
     try:
         log_admin_action('view_dashboard', 'analytics_overview')
-        
-        analytics_service = get_analytics_service()
+
+        with _OVERVIEW_LOCK:
+            cached, cached_at = _OVERVIEW_CACHE
+        if cached is not None and time.monotonic() - cached_at < _OVERVIEW_CACHE_TTL:
+            return jsonify(cached), 200
+
+        analytics_service = _get_analytics_service()
         now = datetime.utcnow()
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
         week_start = now - timedelta(days=7)
         month_start = now - timedelta(days=30)
         
-        # Total queries (today, week, month)
-        queries_today = auth_service.admin_supabase.table('query_analytics')\
-            .select('id', count='exact')\
-            .gte('created_at', today_start.isoformat())\
-            .execute()
-        
-        queries_week = auth_service.admin_supabase.table('query_analytics')\
-            .select('id', count='exact')\
-            .gte('created_at', week_start.isoformat())\
-            .execute()
-        
-        queries_month = auth_service.admin_supabase.table('query_analytics')\
-            .select('id', count='exact')\
-            .gte('created_at', month_start.isoformat())\
-            .execute()
-        
-        # Active users (unique users who queried this week)
-        active_users_response = auth_service.admin_supabase.table('query_analytics')\
-            .select('user_id')\
-            .gte('created_at', week_start.isoformat())\
-            .execute()
-        
-        unique_users = len(set(r['user_id'] for r in active_users_response.data)) if active_users_response.data else 0
-        
+        # All seven counters in one round trip via the admin_dashboard_overview
+        # RPC (FILTER counts over query_analytics/user_feedback/admin_notifications).
+        # Falls back to the per-table queries if the function isn't deployed.
+        stats = None
+        try:
+            rpc_response = auth_service.admin_supabase.rpc('admin_dashboard_overview', {
+                'today_start': today_start.isoformat(),
+                'week_start': week_start.isoformat(),
+                'month_start': month_start.isoformat()
+            }).execute()
+            if rpc_response.data and isinstance(rpc_response.data, dict):
+                stats = rpc_response.data
+        except Exception as rpc_error:
+            logger.debug("admin_dashboard_overview RPC unavailable, falling back: %s", rpc_error)
+
+        if stats is None:
+            # Total queries (today, week, month)
+            queries_today = auth_service.admin_supabase.table('query_analytics')\
+                .select('id', count='exact')\
+                .gte('created_at', today_start.isoformat())\
+                .execute()
+
+            queries_week = auth_service.admin_supabase.table('query_analytics')\
+                .select('id', count='exact')\
+                .gte('created_at', week_start.isoformat())\
+                .execute()
+
+            queries_month = auth_service.admin_supabase.table('query_analytics')\
+                .select('id', count='exact')\
+                .gte('created_at', month_start.isoformat())\
+                .execute()
+
+            # Active users (unique users who queried this week): count the
+            # distinct set in Postgres — one integer over the wire instead of
+            # every user_id for the week
+            unique_users = None
+            try:
+                active_users_rpc = auth_service.admin_supabase.rpc(
+                    'active_users_since', {'since_ts': week_start.isoformat()}
+                ).execute()
+                if isinstance(active_users_rpc.data, int):
+                    unique_users = active_users_rpc.data
+            except Exception as rpc_error:
+                logger.debug("active_users_since RPC unavailable, falling back: %s", rpc_error)
+
+            if unique_users is None:
+                active_users_response = auth_service.admin_supabase.table('query_analytics')\
+                    .select('user_id')\
+                    .gte('created_at', week_start.isoformat())\
+                    .execute()
+
+                # Set comprehension dedupes in one C-level pass (no generator hop)
+                unique_users = len({r['user_id'] for r in active_users_response.data}) if active_users_response.data else 0
+
+            # Satisfaction rate (this week)
+            feedback_response = auth_service.admin_supabase.table('user_feedback')\
+                .select('rating')\
+                .gte('created_at', week_start.isoformat())\
+                .execute()
+
+            satisfaction_rate = 0
+            total_feedback = 0
+            if feedback_response.data:
+                ratings = [r['rating'] for r in feedback_response.data]
+                total_feedback = len(ratings)
+                positive_count = sum(1 for r in ratings if r >= 4)
+                satisfaction_rate = (positive_count / total_feedback * 100) if total_feedback > 0 else 0
+
+            # Unread notifications
+            notifications_response = auth_service.admin_supabase.table('admin_notifications')\
+                .select('id', count='exact')\
+                .eq('is_read', False)\
+                .execute()
+
+            stats = {
+                'queries_today': queries_today.count if hasattr(queries_today, 'count') else 0,
+                'queries_week': queries_week.count if hasattr(queries_week, 'count') else 0,
+                'queries_month': queries_month.count if hasattr(queries_month, 'count') else 0,
+                'active_users': unique_users,
+                'satisfaction_rate': satisfaction_rate,
+                'total_feedback': total_feedback,
+                'unread_notifications': notifications_response.count if hasattr(notifications_response, 'count') else 0
+            }
+
         # COMPETITION: Response time calculation temporarily hidden from UI for competition presentation.
         # NOTE: Database query_analytics.response_time_ms field continues collecting data.
         # Backend calculation preserved for post-competition analysis.
@@ -810,61 +1177,48 @@ def admin_analytics_overview():
         #     .gte('created_at', week_start.isoformat())\
         #     .not_.is_('response_time_ms', 'null')\
         #     .execute()
-        # 
+        #
         # avg_response_time = 0
         # if avg_response_response.data:
         #     times = [r['response_time_ms'] for r in avg_response_response.data]
         #     avg_response_time = sum(times) / len(times) if times else 0
-        
-        # Satisfaction rate (this week)
-        feedback_response = auth_service.admin_supabase.table('user_feedback')\
-            .select('rating')\
-            .gte('created_at', week_start.isoformat())\
-            .execute()
-        
-        satisfaction_rate = 0
-        total_feedback = 0
-        if feedback_response.data:
-            ratings = [r['rating'] for r in feedback_response.data]
-            total_feedback = len(ratings)
-            positive_count = sum(1 for r in ratings if r >= 4)
-            satisfaction_rate = (positive_count / total_feedback * 100) if total_feedback > 0 else 0
-        
+
         # Top keywords (this week)
         top_keywords = analytics_service.compute_keyword_trends(hours=168)[:10]  # 7 days
-        
-        # Unread notifications
-        notifications_response = auth_service.admin_supabase.table('admin_notifications')\
-            .select('id', count='exact')\
-            .eq('is_read', False)\
-            .execute()
-        
+
         overview_data = {
-            'queries_today': queries_today.count if hasattr(queries_today, 'count') else 0,
-            'queries_week': queries_week.count if hasattr(queries_week, 'count') else 0,
-            'queries_month': queries_month.count if hasattr(queries_month, 'count') else 0,
-            'active_users': unique_users,
+            'queries_today': stats.get('queries_today', 0),
+            'queries_week': stats.get('queries_week', 0),
+            'queries_month': stats.get('queries_month', 0),
+            'active_users': stats.get('active_users', 0),
             # COMPETITION: Temporarily hidden - uncomment to include in API response
             # 'avg_response_time_ms': round(avg_response_time, 0),
-            'satisfaction_rate': round(satisfaction_rate, 1),
-            'total_feedback': total_feedback,
+            'satisfaction_rate': round(stats.get('satisfaction_rate', 0) or 0, 1),
+            'total_feedback': stats.get('total_feedback', 0),
             'top_keywords': top_keywords,
-            'unread_notifications': notifications_response.count if hasattr(notifications_response, 'count') else 0
+            'unread_notifications': stats.get('unread_notifications', 0)
         }
-        
+
+        with _OVERVIEW_LOCK:
+            _OVERVIEW_CACHE = (overview_data, time.monotonic())
+
         return jsonify(overview_data), 200
         
     except Exception as e:
-        print(f"❌ Admin overview error: {str(e)}")
-        print(f"📋 Traceback: {traceback.format_exc()}")
+        logger.exception("Admin overview error")
         return jsonify({'error': 'Failed to load overview'}), 500
 
+# Query-log projection: everything the dashboard shows, plus the
+# database-computed anonymized_user column in place of the raw user_id.
+_QUERY_LOG_COLUMNS = ('id,created_at,query_text,keywords,response_time_ms,'
+                      'documents_retrieved,search_method,hybrid_score,'
+                      'tokens_used,anonymized_user')
+
+
 @bp.route('/api/admin/analytics/queries', methods=['GET'])
 @admin_required
 def admin_analytics_queries():
     """Get query logs with filters"""
-    from .auth_service import auth_service
-    from .analytics_service import get_analytics_service
     
     try:
         # Get query parameters
@@ -875,7 +1229,10 @@ def admin_analytics_queries():
         min_rating = request.args.get('min_rating')
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 50))
-        
+        # Keyset cursor: created_at/id of the last row on the previous page.
+        after_created_at = request.args.get('after_created_at')
+        after_id = request.args.get('after_id')
+
         log_admin_action('view_queries', 'query_analytics', {
             'date_from': date_from,
             'date_to': date_to,
@@ -883,123 +1240,166 @@ def admin_analytics_queries():
             'search_method': search_method
         })
         
-        analytics_service = get_analytics_service()
-        
-        # Build query
-        query = auth_service.admin_supabase.table('query_analytics').select('*')
-        
-        if date_from:
-            query = query.gte('created_at', date_from)
-        if date_to:
-            query = query.lte('created_at', date_to)
-        if search_method:
-            query = query.eq('search_method', search_method)
-        
-        # Execute query with pagination
-        offset = (page - 1) * per_page
-        response = query.order('created_at', desc=True).range(offset, offset + per_page - 1).execute()
-        
-        if not response.data:
-            return jsonify({'queries': [], 'total': 0, 'page': page, 'per_page': per_page}), 200
-        
-        # Anonymize user data
-        anonymized_queries = []
-        for record in response.data:
-            record['anonymized_user'] = analytics_service.anonymize_user(record['user_id'])
-            record.pop('user_id', None)  # Remove actual user_id
-            
-            # Filter by keyword if specified
+        analytics_service = _get_analytics_service()
+
+        def build_query(columns):
+            query = auth_service.admin_supabase.table('query_analytics').select(columns)
+
+            if date_from:
+                query = query.gte('created_at', date_from)
+            if date_to:
+                query = query.lte('created_at', date_to)
+            if search_method:
+                query = query.eq('search_method', search_method)
             if keyword:
-                keywords = record.get('keywords', [])
-                if not keywords or keyword.lower() not in [k.lower() for k in keywords]:
-                    continue
-            
-            anonymized_queries.append(record)
-        
-        # Get total count (approximate)
-        count_response = auth_service.admin_supabase.table('query_analytics').select('id', count='exact').execute()
-        total_count = count_response.count if hasattr(count_response, 'count') else len(response.data)
+                # Array containment runs in Postgres (GIN-indexable) instead of
+                # fetching a page and dropping rows in Python, which under-filled
+                # pages and broke the per_page contract.
+                query = query.contains('keywords', [keyword.lower()])
+
+            # Keyset pagination on (created_at DESC, id DESC): seek past the cursor
+            # instead of OFFSET-scanning every earlier page. The id tie-breaker keeps
+            # rows sharing a timestamp from being skipped or repeated across pages.
+            if after_created_at and after_id:
+                query = query.or_(
+                    f'created_at.lt.{after_created_at},'
+                    f'and(created_at.eq.{after_created_at},id.lt.{after_id})'
+                )
+            return query.order('created_at', desc=True).order('id', desc=True).limit(per_page)
+
+        # Prefer the stored anonymized_user column (hashed in Postgres, raw
+        # user_id never leaves the database); fall back to fetching user_id
+        # and hashing here when the migration hasn't been applied.
+        server_anonymized = True
+        try:
+            response = build_query(_QUERY_LOG_COLUMNS).execute()
+        except Exception as column_error:
+            logger.debug("anonymized_user column unavailable, hashing in app: %s", column_error)
+            server_anonymized = False
+            response = build_query('*').execute()
+
+        if not response.data:
+            return jsonify({'queries': [], 'total': 0, 'page': page, 'per_page': per_page, 'next_cursor': None}), 200
+
+        next_cursor = None
+        if len(response.data) == per_page:
+            last_row = response.data[-1]
+            next_cursor = {'after_created_at': last_row['created_at'], 'after_id': last_row['id']}
+        
+        # Anonymize user data (already done in the database on the fast path)
+        anonymized_queries = response.data
+        if not server_anonymized:
+            for record in anonymized_queries:
+                record['anonymized_user'] = analytics_service.anonymize_user(record['user_id'])
+                record.pop('user_id', None)  # Remove actual user_id
+        
+        # Approximate total from the planner stats (Prefer: count=planned →
+        # pg_class.reltuples) instead of an exact full-table count, and only
+        # on the first page — later pages reuse the figure client-side.
+        total_count = None
+        if not (after_created_at and after_id):
+            count_response = auth_service.admin_supabase.table('query_analytics')\
+                .select('id', count='planned')\
+                .limit(1)\
+                .execute()
+            total_count = count_response.count if hasattr(count_response, 'count') else len(response.data)
         
         return jsonify({
             'queries': anonymized_queries,
             'total': total_count,
             'page': page,
-            'per_page': per_page
+            'per_page': per_page,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
-        print(f"❌ Admin queries error: {str(e)}")
+        logger.error("Admin queries error: %s", e)
         return jsonify({'error': 'Failed to load queries'}), 500
 
 @bp.route('/api/admin/analytics/trends', methods=['GET'])
 @admin_required
 def admin_analytics_trends():
     """Get trend data for charts"""
-    from .auth_service import auth_service
     
     try:
         log_admin_action('view_trends', 'analytics_trends')
-        
-        # Get queries per day for last 30 days
+
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
+
+        # Daily series straight from the nightly rollup that
+        # aggregate_to_daily_summary already maintains: ~30 precomputed rows
+        # instead of re-aggregating a month of raw data on every call.
+        rollup_per_day = None
+        try:
+            rollup = auth_service.admin_supabase.table('analytics_summary_daily')\
+                .select('summary_date, query_count')\
+                .gte('summary_date', thirty_days_ago.date().isoformat())\
+                .order('summary_date')\
+                .execute()
+            if rollup.data:
+                rollup_per_day = [
+                    {'date': r['summary_date'], 'count': r['query_count']}
+                    for r in rollup.data
+                ]
+        except Exception as rollup_error:
+            logger.debug("Daily rollup unavailable, aggregating live: %s", rollup_error)
+
+        # Hourly buckets (and the daily series when the rollup is empty) from
+        # the trends_last_30d RPC: date_trunc GROUP BY ships ~30+24 buckets
+        # instead of every raw timestamp.
+        try:
+            rpc_response = auth_service.admin_supabase.rpc('trends_last_30d').execute()
+            if rpc_response.data and isinstance(rpc_response.data, dict):
+                return jsonify({
+                    'queries_per_day': rollup_per_day or rpc_response.data.get('queries_per_day') or [],
+                    'queries_per_hour': rpc_response.data.get('queries_per_hour') or []
+                }), 200
+        except Exception as rpc_error:
+            logger.debug("trends_last_30d RPC unavailable, falling back: %s", rpc_error)
+
+        # Fallback: fetch raw timestamps and bucket them here
         response = auth_service.admin_supabase.table('query_analytics')\
             .select('created_at')\
             .gte('created_at', thirty_days_ago.isoformat())\
             .execute()
         
         if not response.data:
-            return jsonify({'queries_per_day': [], 'queries_per_hour': []}), 200
-        
-        # Group by day
-        from collections import defaultdict
-        queries_by_day = defaultdict(int)
-        queries_by_hour = defaultdict(int)
-        
-        for record in response.data:
-            created_at_str = record['created_at']
-            try:
-                # Fix: Handle Supabase timestamp format with microseconds
-                # Format: 2025-11-20T10:31:06.5996+00:00
-                if '+' in created_at_str and '.' in created_at_str:
-                    # Split on '.' to remove problematic microseconds
-                    date_part, tz_part = created_at_str.split('.')
-                    # Extract timezone from tz_part (e.g., "5996+00:00" -> "+00:00")
-                    tz_offset = '+' + tz_part.split('+')[1] if '+' in tz_part else '+00:00'
-                    created_at_str = date_part + tz_offset
-                
-                created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
-                day_key = created_at.strftime('%Y-%m-%d')
-                hour_key = created_at.hour
-                
-                queries_by_day[day_key] += 1
-                queries_by_hour[hour_key] += 1
-            except Exception as parse_error:
-                print(f"⚠️  Skipping invalid timestamp: {record['created_at']} - {str(parse_error)}")
-                continue
-        
+            return jsonify({'queries_per_day': rollup_per_day or [], 'queries_per_hour': []}), 200
+
+        # Parse and bucket all timestamps in one vectorized pass instead of a
+        # per-row fromisoformat loop. pandas handles Supabase's variable-width
+        # fractional seconds natively; unparseable rows become NaT and drop out.
+        import pandas as pd
+
+        timestamps = pd.to_datetime(
+            pd.Series([record['created_at'] for record in response.data]),
+            utc=True, format='ISO8601', errors='coerce'
+        ).dropna()
+
+        by_day = timestamps.dt.strftime('%Y-%m-%d').value_counts().sort_index()
+        by_hour = timestamps.dt.hour.value_counts().sort_index()
+
         # Format for charts
-        queries_per_day = [{'date': day, 'count': count} for day, count in sorted(queries_by_day.items())]
-        queries_per_hour = [{'hour': hour, 'count': count} for hour, count in sorted(queries_by_hour.items())]
+        queries_per_day = [{'date': day, 'count': int(count)} for day, count in by_day.items()]
+        queries_per_hour = [{'hour': int(hour), 'count': int(count)} for hour, count in by_hour.items()]
         
         return jsonify({
-            'queries_per_day': queries_per_day,
+            'queries_per_day': rollup_per_day or queries_per_day,
             'queries_per_hour': queries_per_hour
         }), 200
         
     except Exception as e:
-        print(f"❌ Admin trends error: {str(e)}")
+        logger.error("Admin trends error: %s", e)
         return jsonify({'error': 'Failed to load trends'}), 500
 
 @bp.route('/api/admin/analytics/export/<export_type>', methods=['GET'])
 @admin_required
 def admin_analytics_export(export_type):
     """Export analytics data as CSV or JSON"""
-    from .auth_service import auth_service
-    from .analytics_service import get_analytics_service
-    import pandas as pd
+    import csv
     from io import StringIO
-    
+    from itertools import chain, islice
+
     try:
         format_type = request.args.get('format', 'csv')  # csv or json
         date_from = request.args.get('date_from')
@@ -1010,27 +1410,63 @@ def admin_analytics_export(export_type):
             'date_to': date_to
         })
         
-        analytics_service = get_analytics_service()
+        analytics_service = _get_analytics_service()
         
         if export_type == 'queries':
-            # Export query logs
-            query = auth_service.admin_supabase.table('query_analytics').select('*')
-            
-            if date_from:
-                query = query.gte('created_at', date_from)
-            if date_to:
-                query = query.lte('created_at', date_to)
-            
-            response = query.order('created_at', desc=True).limit(10000).execute()
-            
-            if not response.data:
+            # Export query logs in keyset batches: the old .limit(10000)
+            # silently truncated larger exports, and fetching everything up
+            # front held the whole range in memory. Each batch seeks past the
+            # (created_at, id) cursor of the previous one, so any range
+            # exports completely with at most one batch resident.
+            batch_size = 1000
+
+            def build_query(columns, cursor):
+                query = auth_service.admin_supabase.table('query_analytics').select(columns)
+
+                if date_from:
+                    query = query.gte('created_at', date_from)
+                if date_to:
+                    query = query.lte('created_at', date_to)
+                if cursor:
+                    query = query.or_(
+                        f'created_at.lt.{cursor[0]},'
+                        f'and(created_at.eq.{cursor[0]},id.lt.{cursor[1]})'
+                    )
+                return query.order('created_at', desc=True).order('id', desc=True).limit(batch_size)
+
+            def iter_rows():
+                # Prefer the database-side anonymized_user column; fall back
+                # to fetching user_id and hashing here if the migration
+                # isn't applied.
+                columns, anonymize = _QUERY_LOG_COLUMNS, False
+                cursor = None
+                while True:
+                    try:
+                        batch = build_query(columns, cursor).execute().data
+                    except Exception as column_error:
+                        if anonymize:
+                            raise
+                        logger.debug("anonymized_user column unavailable, hashing in app: %s", column_error)
+                        columns = _QUERY_LOG_COLUMNS.replace('anonymized_user', 'user_id')
+                        anonymize = True
+                        continue
+                    if not batch:
+                        return
+                    cursor = (batch[-1]['created_at'], batch[-1]['id'])
+                    for row in batch:
+                        if anonymize:
+                            row['anonymized_user'] = analytics_service.anonymize_user(row.pop('user_id', None))
+                        yield row
+                    if len(batch) < batch_size:
+                        return
+
+            row_iter = iter_rows()
+            first_row = next(row_iter, None)
+            if first_row is None:
                 return jsonify({'error': 'No data to export'}), 404
-            
-            # Convert to DataFrame and anonymize
-            df = pd.DataFrame(response.data)
-            df['anonymized_user'] = df['user_id'].apply(analytics_service.anonymize_user)
-            df = df.drop(columns=['user_id'])
-            
+            row_iter = chain([first_row], row_iter)
+            fieldnames = _QUERY_LOG_COLUMNS.split(',')
+
         elif export_type == 'stats':
             # Export aggregated statistics
             # Get daily summaries
@@ -1042,24 +1478,42 @@ def admin_analytics_export(export_type):
             
             if not response.data:
                 return jsonify({'error': 'No stats to export'}), 404
-            
-            df = pd.DataFrame(response.data)
+
+            row_iter = iter(response.data)
+            fieldnames = list(response.data[0].keys())
         else:
             return jsonify({'error': 'Invalid export type'}), 400
-        
+
         # Generate export
         if format_type == 'csv':
-            output = StringIO()
-            df.to_csv(output, index=False)
-            csv_data = output.getvalue()
-            
+            # Stream one CSV line per row instead of materializing everything
+            # first; peak memory stays O(batch) and the client starts
+            # receiving data immediately.
+            def generate_csv():
+                buf = StringIO()
+                writer = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction='ignore')
+                writer.writeheader()
+                yield buf.getvalue()
+                for row in row_iter:
+                    buf.seek(0)
+                    buf.truncate(0)
+                    writer.writerow(row)
+                    yield buf.getvalue()
+
             return Response(
-                csv_data,
+                stream_with_context(generate_csv()),
                 mimetype='text/csv',
                 headers={'Content-Disposition': f'attachment; filename={export_type}_{datetime.utcnow().strftime("%Y%m%d")}.csv'}
             )
         else:  # json
-            json_data = df.to_json(orient='records', date_format='iso')
+            # JSON has to materialize one document, so keep the former cap
+            rows = list(islice(row_iter, 10000))
+            # Rows are already JSON-shaped dicts; serialize directly instead
+            # of routing through a DataFrame's dtype inference.
+            if orjson is not None:
+                json_data = orjson.dumps(rows, default=str).decode()
+            else:
+                json_data = json.dumps(rows, default=str)
             
             return Response(
                 json_data,
@@ -1068,15 +1522,13 @@ def admin_analytics_export(export_type):
             )
         
     except Exception as e:
-        print(f"❌ Export error: {str(e)}")
-        print(f"📋 Traceback: {traceback.format_exc()}")
+        logger.exception("Export error")
         return jsonify({'error': 'Export failed'}), 500
 
 @bp.route('/api/admin/notifications', methods=['GET'])
 @admin_required
 def admin_get_notifications():
     """Get admin notifications"""
-    from .auth_service import auth_service
     
     try:
         is_read = request.args.get('is_read')
@@ -1091,14 +1543,13 @@ def admin_get_notifications():
         return jsonify({'notifications': response.data}), 200
         
     except Exception as e:
-        print(f"❌ Notifications error: {str(e)}")
+        logger.error("Notifications error: %s", e)
         return jsonify({'error': 'Failed to load notifications'}), 500
 
 @bp.route('/api/admin/notifications/<notification_id>/mark-read', methods=['PUT'])
 @admin_required
 def admin_mark_notification_read(notification_id):
     """Mark notification as read"""
-    from .auth_service import auth_service
     
     try:
         auth_service.admin_supabase.table('admin_notifications')\
@@ -1107,22 +1558,45 @@ def admin_mark_notification_read(notification_id):
             .execute()
         
         return jsonify({'message': 'Notification marked as read'}), 200
-        
+
     except Exception as e:
-        print(f"❌ Mark notification error: {str(e)}")
+        logger.error("Mark notification error: %s", e)
         return jsonify({'error': 'Failed to update notification'}), 500
 
+@bp.route('/api/admin/notifications/mark-read', methods=['PUT'])
+@admin_required
+def admin_mark_notifications_read():
+    """Mark a batch of notifications as read in one update"""
+
+    try:
+        data = request.get_json()
+        ids = data.get('ids') if data else None
+
+        if not ids or not isinstance(ids, list):
+            return jsonify({'error': 'ids list is required'}), 400
+
+        # One UPDATE ... WHERE id IN (...) instead of a round trip per
+        # notification; the PK index resolves the whole batch in one scan
+        auth_service.admin_supabase.table('admin_notifications')\
+            .update({'is_read': True})\
+            .in_('id', ids)\
+            .execute()
+
+        return jsonify({'message': f'{len(ids)} notification(s) marked as read'}), 200
+
+    except Exception as e:
+        logger.error("Mark notifications error: %s", e)
+        return jsonify({'error': 'Failed to update notifications'}), 500
+
 @bp.route('/api/admin/users/activity', methods=['GET'])
 @admin_required
 def admin_user_activity():
     """Get anonymized user activity statistics"""
-    from .auth_service import auth_service
-    from .analytics_service import get_analytics_service
     
     try:
         log_admin_action('view_users', 'user_activity')
         
-        analytics_service = get_analytics_service()
+        analytics_service = _get_analytics_service()
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
         
@@ -1148,41 +1622,43 @@ def admin_user_activity():
         return jsonify({'users': user_stats}), 200
         
     except Exception as e:
-        print(f"❌ User activity error: {str(e)}")
+        logger.error("User activity error: %s", e)
         return jsonify({'error': 'Failed to load user activity'}), 500
 
 @bp.route('/api/admin/maintenance/cleanup', methods=['POST'])
 @admin_required
 def admin_maintenance_cleanup():
     """Manually trigger cleanup of expired data"""
-    from .auth_service import auth_service
     
     try:
         log_admin_action('maintenance_cleanup', 'database')
         
         # Call the cleanup function
         auth_service.admin_supabase.rpc('cleanup_expired_analytics').execute()
-        
+
+        _invalidate_overview_cache()
+
         return jsonify({'message': 'Cleanup completed successfully'}), 200
         
     except Exception as e:
-        print(f"❌ Cleanup error: {str(e)}")
+        logger.error("Cleanup error: %s", e)
         return jsonify({'error': 'Cleanup failed'}), 500
 
 @bp.route('/api/admin/maintenance/aggregate', methods=['POST'])
 @admin_required
 def admin_maintenance_aggregate():
     """Manually trigger daily aggregation"""
-    from .auth_service import auth_service
     
     try:
         log_admin_action('maintenance_aggregate', 'database')
         
         # Call the aggregation function
         auth_service.admin_supabase.rpc('aggregate_to_daily_summary').execute()
-        
+
+        _invalidate_overview_cache()
+
         return jsonify({'message': 'Aggregation completed successfully'}), 200
         
     except Exception as e:
-        print(f"❌ Aggregation error: {str(e)}")
+        logger.error("Aggregation error: %s", e)
         return jsonify({'error': 'Aggregation failed'}), 500
\ No newline at end of file
@@ -4,6 +4,8 @@
 // State
 let currentPage = 1;
 let currentFilters = {};
+// Keyset cursors per page: queryCursors[n] is the cursor that fetches page n+1.
+let queryCursors = [null];
 let queriesChart = null;
 let keywordsChart = null;
 let trendsDailyChart = null;
@@ -257,6 +259,7 @@ function setupFilters() {
             search_method: document.getElementById('filter-search-method').value
         };
         currentPage = 1;
+        queryCursors = [null];
         loadQueryLogs();
     });
     
@@ -267,6 +270,7 @@ function setupFilters() {
         document.getElementById('filter-search-method').value = '';
         currentFilters = {};
         currentPage = 1;
+        queryCursors = [null];
         loadQueryLogs();
     });
     
@@ -295,6 +299,11 @@ async function loadQueryLogs() {
             per_page: 50,
             ...currentFilters
         });
+        const cursor = queryCursors[currentPage - 1];
+        if (cursor) {
+            params.set('after_created_at', cursor.after_created_at);
+            params.set('after_id', cursor.after_id);
+        }
         
         const response = await fetch(`/api/admin/analytics/queries?${params}`);
         const data = await response.json();
@@ -343,12 +352,15 @@ async function loadQueryLogs() {
         html += '</tbody></table>';
         container.innerHTML = html;
         
-        // Update pagination
-        const totalPages = Math.ceil(data.total / 50);
+        // Update pagination: remember the cursor that fetches the next page
+        queryCursors[currentPage] = data.next_cursor || null;
+        if (data.total != null) {
+            // Planner estimate, only sent with the first page
+            document.getElementById('total-pages').textContent = '≈' + Math.ceil(data.total / 50);
+        }
         document.getElementById('current-page').textContent = currentPage;
-        document.getElementById('total-pages').textContent = totalPages;
         document.getElementById('prev-page-btn').disabled = currentPage <= 1;
-        document.getElementById('next-page-btn').disabled = currentPage >= totalPages;
+        document.getElementById('next-page-btn').disabled = !data.next_cursor;
         document.getElementById('query-pagination').style.display = 'flex';
         
     } catch (error) {
@@ -20,6 +20,7 @@ const logoutBtn = document.getElementById('logout-btn');
 // State
 let isTyping = false;
 let currentChatId = null;
+let lastBotMessageId = null; // message_id from the latest streamed done frame
 let currentUser = null; // Store user info
 
 // Configure marked.js for better Markdown rendering
@@ -482,8 +483,8 @@ function addMessage(sender, text, id = null, isMarkdown = false) {
 
 async function submitFeedback(chatSessionId, rating, feedbackText = '') {
     try {
-        // Get the most recent bot message from current session
-        // The backend will match this to the latest bot message in the chat session
+        // The streamed done frame carries the bot message id; echo it back
+        // so the backend doesn't have to look up the latest bot message
         const response = await fetch('/api/feedback', {
             method: 'POST',
             headers: {
@@ -491,6 +492,7 @@ async function submitFeedback(chatSessionId, rating, feedbackText = '') {
             },
             body: JSON.stringify({
                 chat_session_id: chatSessionId,
+                chat_message_id: lastBotMessageId,
                 rating: rating,
                 feedback_text: feedbackText
             })
@@ -685,7 +687,15 @@ async function sendMessageWithStreaming(message, typingId) {
                         }, 500);
                     }
                     
-                    if (data.token) {
+                    // Remember the bot message id so feedback can reference it
+                    if (data.message_id) {
+                        lastBotMessageId = data.message_id;
+                    }
+                    
+                    // Servers send either a single token or a coalesced
+                    // batch of tokens per frame
+                    const tokenText = data.tokens ? data.tokens.join('') : data.token;
+                    if (tokenText) {
                         // Remove cursor on first token
                         if (isFirstToken) {
                             fullText = '';
@@ -694,7 +704,7 @@ async function sendMessageWithStreaming(message, typingId) {
                         }
                         
                         // Add to render queue and schedule immediate render
-                        renderQueue += data.token;
+                        renderQueue += tokenText;
                         scheduleRender();
                     }
                 } catch (e) {
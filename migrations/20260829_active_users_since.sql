@@ -0,0 +1,13 @@
+-- Count distinct active users server-side.
+--
+-- The dashboard overview fallback pulled every user_id from the past week
+-- just to count uniques in Python. This function returns the single integer
+-- instead; the covering index on (created_at DESC) keeps the scan cheap.
+
+CREATE OR REPLACE FUNCTION active_users_since(since_ts timestamptz)
+RETURNS integer
+LANGUAGE sql STABLE AS $$
+  SELECT count(DISTINCT user_id)::int
+  FROM query_analytics
+  WHERE created_at >= since_ts;
+$$;
@@ -0,0 +1,20 @@
+-- All dashboard overview counters in one round trip.
+--
+-- admin_analytics_overview calls this first; the six per-table queries stay
+-- in the app as the fallback until this is applied.
+
+CREATE OR REPLACE FUNCTION admin_dashboard_overview(
+    today_start timestamptz, week_start timestamptz, month_start timestamptz)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+  SELECT json_build_object(
+    'queries_today', (SELECT count(*) FROM query_analytics WHERE created_at >= today_start),
+    'queries_week',  (SELECT count(*) FROM query_analytics WHERE created_at >= week_start),
+    'queries_month', (SELECT count(*) FROM query_analytics WHERE created_at >= month_start),
+    'active_users',  (SELECT count(DISTINCT user_id) FROM query_analytics WHERE created_at >= week_start),
+    'satisfaction_rate', (SELECT coalesce(100.0 * count(*) FILTER (WHERE rating >= 4) / nullif(count(*), 0), 0)
+                          FROM user_feedback WHERE created_at >= week_start),
+    'total_feedback', (SELECT count(*) FROM user_feedback WHERE created_at >= week_start),
+    'unread_notifications', (SELECT count(*) FROM admin_notifications WHERE is_read = false)
+  );
+$$;
@@ -0,0 +1,17 @@
+-- All anomaly-check counters in one round trip.
+--
+-- run_anomaly_checks fetches this snapshot first and hands the counts to the
+-- individual checks; each check keeps its own queries as the fallback until
+-- this is applied.
+
+CREATE OR REPLACE FUNCTION anomaly_snapshot()
+RETURNS json
+LANGUAGE sql STABLE AS $$
+  SELECT json_build_object(
+    'queries_last_hour', (SELECT count(*) FROM query_analytics WHERE created_at > now() - interval '1 hour'),
+    'queries_last_7d',   (SELECT count(*) FROM query_analytics WHERE created_at > now() - interval '7 days'),
+    'errors_last_hour',  (SELECT count(*) FROM error_logs WHERE created_at > now() - interval '1 hour'),
+    'feedback_total_24h',    (SELECT count(*) FROM user_feedback WHERE created_at > now() - interval '1 day'),
+    'feedback_positive_24h', (SELECT count(*) FILTER (WHERE rating >= 4) FROM user_feedback WHERE created_at > now() - interval '1 day')
+  );
+$$;
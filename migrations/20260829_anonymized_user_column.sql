@@ -0,0 +1,15 @@
+-- Database-side user anonymization for the admin query log and exports.
+--
+-- The stored column lets the endpoints select anonymized_user instead of
+-- user_id, so raw IDs never leave the database. The expression mirrors the
+-- app's _anonymize_id label exactly: user ids are UUIDs, and the label is
+-- 'User#' plus the first 3 bytes (6 lowercase hex chars) of the UUID - no
+-- hashing or salt involved, so the fallback path in the app produces
+-- identical labels. The expression is immutable (uuid::text cast plus
+-- string functions), so a STORED generated column works and ADD COLUMN
+-- backfills every existing row in the same statement.
+
+ALTER TABLE query_analytics ADD COLUMN IF NOT EXISTS anonymized_user text
+  GENERATED ALWAYS AS (
+    'User#' || substr(replace(user_id::text, '-', ''), 1, 6)
+  ) STORED;
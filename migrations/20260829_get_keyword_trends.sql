@@ -0,0 +1,16 @@
+-- Aggregate keyword trends server-side.
+--
+-- compute_keyword_trends / get_top_keywords call this first so only the top
+-- rows cross the wire instead of every keywords array in the window; the
+-- Python Counter aggregation remains as the fallback until this is applied.
+
+CREATE OR REPLACE FUNCTION get_keyword_trends(hours int, lim int)
+RETURNS TABLE(keyword text, count bigint)
+LANGUAGE sql STABLE AS $$
+  SELECT kw, count(*)
+  FROM query_analytics, unnest(keywords) AS kw
+  WHERE created_at >= now() - make_interval(hours => hours)
+  GROUP BY 1
+  ORDER BY 2 DESC
+  LIMIT lim;
+$$;
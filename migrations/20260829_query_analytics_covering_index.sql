@@ -0,0 +1,16 @@
+-- Covering index for the admin analytics endpoints.
+--
+-- The query log, trends, overview, and export endpoints all filter and order
+-- query_analytics on created_at and read a small, stable set of columns.
+-- INCLUDE-ing those columns lets Postgres answer them with index-only scans
+-- (no heap fetches), which is where most of the I/O for these endpoints goes.
+--
+-- Run against the Supabase database (SQL editor or psql). CONCURRENTLY
+-- avoids locking writes while the index builds; it cannot run inside a
+-- transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_qa_created_desc_cover
+    ON query_analytics (created_at DESC)
+    INCLUDE (id, user_id, search_method, keywords, response_time_ms);
+
+ANALYZE query_analytics;
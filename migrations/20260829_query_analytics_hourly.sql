@@ -0,0 +1,27 @@
+-- Hourly insert-count rollup for the query-spike baseline.
+--
+-- check_query_spike's fallback (used when anomaly_snapshot isn't deployed)
+-- averages this table's ~168 small rows for the 7-day baseline instead of
+-- exact-counting the whole window every hour; a trigger keeps the buckets
+-- current on every query_analytics insert.
+
+CREATE TABLE IF NOT EXISTS query_analytics_hourly(
+    hour timestamptz PRIMARY KEY,
+    cnt int NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION bump_hourly_bucket()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO query_analytics_hourly(hour, cnt)
+  VALUES (date_trunc('hour', now()), 1)
+  ON CONFLICT (hour) DO UPDATE SET cnt = query_analytics_hourly.cnt + 1;
+  RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS query_analytics_hourly_trg ON query_analytics;
+CREATE TRIGGER query_analytics_hourly_trg
+AFTER INSERT ON query_analytics
+FOR EACH ROW EXECUTE FUNCTION bump_hourly_bucket();
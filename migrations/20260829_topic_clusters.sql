@@ -0,0 +1,48 @@
+-- Server-side topic clustering over a normalized keyword table.
+--
+-- get_topic_clusters calls topic_clusters() so only the aggregated clusters
+-- cross the wire; a trigger keeps query_keywords in sync with the keywords
+-- array on query_analytics. The Python grouping remains as the fallback
+-- until this is applied.
+
+CREATE TABLE IF NOT EXISTS query_keywords(
+    query_id uuid REFERENCES query_analytics(id) ON DELETE CASCADE,
+    keyword text,
+    PRIMARY KEY(query_id, keyword)
+);
+
+CREATE INDEX IF NOT EXISTS idx_query_keywords_keyword ON query_keywords(keyword);
+
+CREATE OR REPLACE FUNCTION sync_query_keywords()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  DELETE FROM query_keywords WHERE query_id = NEW.id;
+  INSERT INTO query_keywords(query_id, keyword)
+  SELECT NEW.id, unnest(NEW.keywords) ON CONFLICT DO NOTHING;
+  RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS query_keywords_sync ON query_analytics;
+CREATE TRIGGER query_keywords_sync
+AFTER INSERT OR UPDATE OF keywords ON query_analytics
+FOR EACH ROW WHEN (NEW.keywords IS NOT NULL)
+EXECUTE FUNCTION sync_query_keywords();
+
+-- Backfill: the trigger only covers writes from here on, so without this
+-- every row analyzed before the migration is invisible to topic_clusters().
+INSERT INTO query_keywords(query_id, keyword)
+SELECT id, unnest(keywords) FROM query_analytics
+WHERE keywords IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION topic_clusters(date_from timestamptz DEFAULT NULL, date_to timestamptz DEFAULT NULL)
+RETURNS TABLE(keyword text, ids uuid[])
+LANGUAGE sql STABLE AS $$
+  SELECT k.keyword, array_agg(k.query_id)
+  FROM query_keywords k JOIN query_analytics q ON q.id = k.query_id
+  WHERE (date_from IS NULL OR q.created_at >= date_from)
+    AND (date_to IS NULL OR q.created_at <= date_to)
+  GROUP BY k.keyword;
+$$;
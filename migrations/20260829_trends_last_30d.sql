@@ -0,0 +1,25 @@
+-- Day/hour trend buckets aggregated server-side.
+--
+-- admin_analytics_trends calls this for the hourly series (and for the daily
+-- series whenever the analytics_summary_daily rollup is empty); the
+-- vectorized in-app bucketing stays as the fallback until this is applied.
+
+CREATE OR REPLACE FUNCTION trends_last_30d()
+RETURNS json
+LANGUAGE sql STABLE AS $$
+  SELECT json_build_object(
+    'queries_per_day', (
+      SELECT coalesce(json_agg(json_build_object(
+               'date', to_char(d, 'YYYY-MM-DD'), 'count', n) ORDER BY d), '[]')
+      FROM (SELECT date_trunc('day', created_at) d, count(*) n
+            FROM query_analytics
+            WHERE created_at >= now() - interval '30 days'
+            GROUP BY 1) day_buckets),
+    'queries_per_hour', (
+      SELECT coalesce(json_agg(json_build_object(
+               'hour', h, 'count', n) ORDER BY h), '[]')
+      FROM (SELECT extract(hour FROM created_at)::int h, count(*) n
+            FROM query_analytics
+            WHERE created_at >= now() - interval '30 days'
+            GROUP BY 1) hour_buckets));
+$$;
@@ -1,17 +1,34 @@
 import os
-from app import create_app
-
-app = create_app()
 
 if __name__ == '__main__':
-    # Skip running development server in production
-    # Use gunicorn instead: gunicorn wsgi:app --bind 0.0.0.0:8080
     environment = os.getenv('FLASK_ENV', os.getenv('ENVIRONMENT', 'development'))
-    
+
     if environment == 'production':
-        print("⚠️  Production environment detected.")
-        print("   Please use gunicorn or another production WSGI server.")
-        print("   Command: gunicorn wsgi:app --bind 0.0.0.0:8080")
+        # Hand the process over to gunicorn instead of just printing the
+        # command. gthread because /api/chat holds a connection open for the
+        # whole LLM stream, which is almost entirely I/O wait. No --preload:
+        # the app starts its own threads at import (deferred RAG/analytics
+        # init, the background database writer), and threads don't survive
+        # the post-preload fork - workers would inherit half-initialized
+        # services and a dead writer thread whose queue never drains.
+        port = os.getenv('PORT', '8080')
+        workers = str(2 * (os.cpu_count() or 1) + 1)
+        # Also read by the app to size its retrieval pool
+        threads = os.environ.setdefault('GUNICORN_THREADS', '4')
+        print(f"🚀 Production environment: exec gunicorn ({workers} workers)")
+        os.execvp('gunicorn', [
+            'gunicorn', 'wsgi:app',
+            '--bind', f'0.0.0.0:{port}',
+            '--workers', workers,
+            '--worker-class', 'gthread',
+            '--threads', threads,
+            '--timeout', '120',
+            '--access-logfile', '-',
+            '--error-logfile', '-',
+        ])
     else:
+        from app import create_app
+
+        app = create_app()
         print("🚀 Starting Flask development server...")
-        app.run(debug=False)
\ No newline at end of file
+        app.run(debug=False)
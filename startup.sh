@@ -78,11 +78,14 @@ export PYTHONUNBUFFERED=1
 # Get port from environment or use default
 PORT=${PORT:-8080}
 
+# Threads per worker - also read by the app to size its retrieval pool
+export GUNICORN_THREADS=${GUNICORN_THREADS:-8}
+
 echo ""
 echo "Configuration Summary:"
 echo "  Environment: $FLASK_ENV"
 echo "  Port: $PORT"
-echo "  Workers: 4"
+echo "  Workers: 4 (gthread, $GUNICORN_THREADS threads each)"
 echo "  Worker timeout: 120s (increased for RAG initialization)"
 echo ""
 echo "======================================================================"
@@ -94,10 +97,15 @@ echo ""
 # Using --access-logfile - for stdout logging (Azure App Service requirement)
 # Using --error-logfile - for stderr logging
 # Increased worker-timeout to 120s to allow RAG service initialization with Qdrant
+# gthread workers: /api/chat holds a connection open for the whole LLM stream,
+# which is almost entirely I/O wait. With sync workers each stream pins one of
+# the 4 worker processes; with 8 threads per worker the same 4 processes can
+# multiplex 32 concurrent streams.
 exec gunicorn wsgi:app \
     --bind 0.0.0.0:${PORT} \
     --workers 4 \
-    --worker-class sync \
+    --worker-class gthread \
+    --threads ${GUNICORN_THREADS} \
     --worker-timeout 120 \
     --timeout 120 \
     --access-logfile - \